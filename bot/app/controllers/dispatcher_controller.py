@@ -9,18 +9,28 @@ from sqlalchemy.orm import sessionmaker
 
 from config.settings import Settings
 from bot.middlewares.db_session import DBSessionMiddleware
+from bot.middlewares.request_clock import RequestClockMiddleware
+from bot.middlewares.user_loader import UserLoaderMiddleware
 from bot.middlewares.i18n import I18nMiddleware, get_i18n_instance, JsonI18n
 from bot.middlewares.ban_check_middleware import BanCheckMiddleware
 from bot.middlewares.action_logger_middleware import ActionLoggerMiddleware
 from bot.middlewares.profile_sync import ProfileSyncMiddleware
 from bot.middlewares.channel_subscription import ChannelSubscriptionMiddleware
 from bot.middlewares.terms_acceptance_middleware import TermsAcceptanceMiddleware
+from bot.middlewares.ratelimit import RateLimitMiddleware, init_concurrency_controller
+from bot.utils.membership_cache import membership_cache
 
 
 def build_dispatcher(settings: Settings, async_session_factory: sessionmaker) -> tuple[Dispatcher, Bot, Dict]:
     storage = MemoryStorage()
     default_props = DefaultBotProperties(parse_mode=ParseMode.HTML)
     bot = Bot(token=settings.BOT_TOKEN, default=default_props)
+    # The concurrency controller must wrap the rate limiter: a send is only
+    # stamped into the rate window once it holds a slot and is about to go out.
+    concurrency_controller = init_concurrency_controller(settings)
+    if concurrency_controller:
+        bot.session.middleware(concurrency_controller)
+    bot.session.middleware(RateLimitMiddleware())
 
     dp = Dispatcher(storage=storage, settings=settings, bot_instance=bot)
 
@@ -29,7 +39,14 @@ def build_dispatcher(settings: Settings, async_session_factory: sessionmaker) ->
     dp["i18n_instance"] = i18n_instance
     dp["async_session_factory"] = async_session_factory
 
+    membership_cache.ttl_seconds = settings.REQUIRED_CHANNEL_CHECK_CACHE_TTL_SECONDS
+
+    # Order matters: session and db_user must exist before the gating
+    # middlewares, which all run on the outer layer so a blocked update
+    # never reaches router filtering or handler lookup.
+    dp.update.outer_middleware(RequestClockMiddleware())
     dp.update.outer_middleware(DBSessionMiddleware(async_session_factory))
+    dp.update.outer_middleware(UserLoaderMiddleware())
     dp.update.outer_middleware(I18nMiddleware(i18n=i18n_instance, settings=settings))
     dp.update.outer_middleware(ProfileSyncMiddleware())
     dp.update.outer_middleware(BanCheckMiddleware(settings=settings, i18n_instance=i18n_instance))
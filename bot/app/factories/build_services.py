@@ -13,6 +13,7 @@ from bot.services.tribute_service import TributeService
 from bot.services.crypto_pay_service import CryptoPayService
 from bot.services.panel_webhook_service import PanelWebhookService
 from bot.services.freekassa_service import FreeKassaService
+from bot.services.notification_service import NotificationService
 
 
 def build_core_services(
@@ -26,6 +27,7 @@ def build_core_services(
     subscription_service = SubscriptionService(settings, panel_service, bot, i18n)
     referral_service = ReferralService(settings, subscription_service, bot, i18n)
     promo_code_service = PromoCodeService(settings, subscription_service, bot, i18n)
+    notification_service = NotificationService(bot, settings, i18n)
     stars_service = StarsService(bot, settings, i18n, subscription_service, referral_service)
     cryptopay_service = CryptoPayService(
         settings.CRYPTOPAY_TOKEN,
@@ -77,6 +79,7 @@ def build_core_services(
         "subscription_service": subscription_service,
         "referral_service": referral_service,
         "promo_code_service": promo_code_service,
+        "notification_service": notification_service,
         "stars_service": stars_service,
         "cryptopay_service": cryptopay_service,
         "freekassa_service": freekassa_service,
@@ -15,6 +15,7 @@ from bot.middlewares.i18n import JsonI18n
 from bot.services.panel_api_service import PanelApiService
 from bot.services.subscription_service import SubscriptionService
 from bot.utils.message_queue import get_queue_manager
+from bot.middlewares.ratelimit import get_concurrency_controller
 
 from . import broadcast as admin_broadcast_handlers
 from .promo import create as admin_promo_create_handlers
@@ -255,6 +256,13 @@ async def show_queue_status_handler(callback: types.CallbackQuery, i18n_data: di
             group_processing="✅ Да" if stats['group_queue_processing'] else "❌ Нет",
             group_recent=stats['group_recent_sends']
         )
+        concurrency_controller = get_concurrency_controller()
+        if concurrency_controller:
+            message_text += _(
+                "admin_queue_bot_api_concurrency_info",
+                concurrency=concurrency_controller.concurrency,
+                in_flight=concurrency_controller.in_flight,
+            )
         
         from bot.keyboards.inline.admin_keyboards import get_back_to_admin_panel_keyboard
         
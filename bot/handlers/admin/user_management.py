@@ -17,6 +17,7 @@ from bot.services.subscription_service import SubscriptionService
 from bot.services.panel_api_service import PanelApiService
 from bot.services.referral_service import ReferralService
 from bot.middlewares.i18n import JsonI18n
+from bot.middlewares.terms_acceptance_middleware import forget_terms_acceptance
 from bot.utils import get_message_content, send_direct_message
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
 from bot.utils.text_sanitizer import (
@@ -873,6 +874,7 @@ async def process_delete_user_confirmation_handler(message: types.Message,
 
         await _log_admin_user_deletion(session, admin_id, admin, target_user_id)
         await session.commit()
+        forget_terms_acceptance(target_user_id)
 
         await message.answer(
             _(
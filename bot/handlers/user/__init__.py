@@ -7,6 +7,8 @@ from . import referral
 from . import promo_user
 from . import trial_handler
 
+start.register_actions()
+
 user_router_aggregate = Router(name="user_router_aggregate")
 
 user_router_aggregate.include_router(promo_user.router)
@@ -1,15 +1,17 @@
+import asyncio
 import logging
 import re
+from functools import partial
 from aiogram import Router, F, types, Bot
 from aiogram.utils.text_decorations import html_decoration as hd
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from typing import Optional, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError
 
-from db.dal import user_dal
+from db.dal import user_dal, ad_dal
 from db.models import User
 
 from bot.keyboards.inline.user_keyboards import (
@@ -17,16 +19,76 @@ from bot.keyboards.inline.user_keyboards import (
     get_language_selection_keyboard,
     get_channel_subscription_keyboard,
     get_terms_acceptance_keyboard,
+    get_connect_and_main_keyboard,
 )
 from bot.services.subscription_service import SubscriptionService
 from bot.services.panel_api_service import PanelApiService
 from bot.services.referral_service import ReferralService
 from bot.services.promo_code_service import PromoCodeService
+from bot.services.notification_service import NotificationService
 from config.settings import Settings
 from bot.middlewares.i18n import JsonI18n
 from bot.utils.text_sanitizer import sanitize_username, sanitize_display_name
+from bot.utils.membership_cache import membership_cache
+from bot.middlewares.terms_acceptance_middleware import (
+    has_accepted_current_terms,
+    mark_terms_accepted,
+)
 
 router = Router(name="user_start_router")
+logger = logging.getLogger(__name__)
+
+_CHANNEL_MEMBER_STATUSES = frozenset(
+    {"creator", "administrator", "member", "restricted"})
+# How often an unchanged channel check result still refreshes checked_at.
+_CHANNEL_CHECK_REFRESH_INTERVAL = timedelta(hours=6)
+
+_START_PARAM_RE = re.compile(
+    r"^(?:ref_(?P<ref>[uU][A-Za-z0-9]{9}|[A-Za-z0-9]{9}|\d+)"
+    r"|promo_(?P<promo>\w+)"
+    r"|(?!ref_|promo_)(?P<ad>[A-Za-z0-9_\-]{2,64}))$")
+
+_background_answers: Set[asyncio.Task] = set()
+
+
+async def _safe_ans(callback: types.CallbackQuery,
+                    text: Optional[str] = None,
+                    show_alert: bool = False) -> None:
+    try:
+        await callback.answer(text, show_alert=show_alert)
+    except Exception as e:
+        logger.debug("callback.answer suppressed for user %s: %s",
+                     callback.from_user.id, e)
+
+
+async def _safe_reply(message: types.Message, text: str, **kwargs) -> bool:
+    """Send a reply; a Bot API failure must not roll back the update's writes."""
+    try:
+        await message.answer(text, **kwargs)
+        return True
+    except TelegramAPIError as e:
+        logger.warning("Failed to reply to user %s: %s",
+                       message.chat.id, e)
+        return False
+
+
+async def _defer_until_commit(
+        after_commit: Optional[List[Callable[[], Awaitable[Any]]]],
+        callback: Callable[[], Awaitable[Any]]) -> None:
+    """Run callback after DBSessionMiddleware commits (immediately without it)."""
+    if after_commit is None:
+        await callback()
+    else:
+        after_commit.append(callback)
+
+
+def _answer_in_background(callback: types.CallbackQuery,
+                          text: Optional[str] = None,
+                          show_alert: bool = False) -> None:
+    """Acknowledge the callback without waiting for the round-trip."""
+    task = asyncio.create_task(_safe_ans(callback, text, show_alert))
+    _background_answers.add(task)
+    task.add_done_callback(_background_answers.discard)
 
 
 async def send_main_menu(target_event: Union[types.Message,
@@ -35,7 +97,9 @@ async def send_main_menu(target_event: Union[types.Message,
                          i18n_data: dict,
                          subscription_service: SubscriptionService,
                          session: AsyncSession,
-                         is_edit: bool = False):
+                         is_edit: bool = False,
+                         prepend_welcome: bool = False,
+                         db_user: Optional[User] = None):
     current_lang = i18n_data.get("current_language", settings.DEFAULT_LANGUAGE)
     i18n: Optional[JsonI18n] = i18n_data.get("i18n_instance")
 
@@ -43,14 +107,12 @@ async def send_main_menu(target_event: Union[types.Message,
     user_full_name = hd.quote(target_event.from_user.full_name)
 
     if not i18n:
-        logging.error(
+        logger.error(
             f"i18n_instance missing in send_main_menu for user {user_id}")
         err_msg_fallback = "Error: Language service unavailable. Please try again later."
         if isinstance(target_event, types.CallbackQuery):
-            try:
-                await target_event.answer(err_msg_fallback, show_alert=True)
-            except Exception:
-                pass
+            _answer_in_background(target_event, err_msg_fallback,
+                                  show_alert=True)
         elif isinstance(target_event, types.Message):
             try:
                 await target_event.answer(err_msg_fallback)
@@ -59,26 +121,22 @@ async def send_main_menu(target_event: Union[types.Message,
         return
 
 
-    _ = lambda key, **kwargs: i18n.gettext(current_lang, key, **kwargs)
+    _ = i18n.translator(current_lang)
 
     show_trial_button_in_menu = False
     if settings.TRIAL_ENABLED:
-        if hasattr(
-                subscription_service, 'has_had_any_subscription') and callable(
-                    getattr(subscription_service, 'has_had_any_subscription')):
-            if not await subscription_service.has_had_any_subscription(
-                    session, user_id):
-                show_trial_button_in_menu = True
-        else:
-            logging.error(
-                "Method has_had_any_subscription is missing in SubscriptionService for send_main_menu!"
-            )
+        if db_user is None:
+            db_user = await user_dal.get_user_by_id(session, user_id)
+        show_trial_button_in_menu = not (db_user
+                                         and db_user.has_ever_subscribed)
 
     text = _(key="main_menu_greeting", user_name=user_full_name)
+    if prepend_welcome:
+        text = _(key="welcome", user_name=user_full_name) + "\n\n" + text
     reply_markup = get_main_menu_inline_keyboard(current_lang, i18n, settings,
                                                  show_trial_button_in_menu)
 
-    target_message_obj: Optional[types.Message] = None
+    target_message_obj: Optional[types.MaybeInaccessibleMessage] = None
     if isinstance(target_event, types.Message):
         target_message_obj = target_event
     elif isinstance(target_event,
@@ -86,7 +144,7 @@ async def send_main_menu(target_event: Union[types.Message,
         target_message_obj = target_event.message
 
     if not target_message_obj:
-        logging.error(
+        logger.error(
             f"send_main_menu: target_message_obj is None for event from user {user_id}."
         )
         if isinstance(target_event, types.CallbackQuery):
@@ -94,34 +152,49 @@ async def send_main_menu(target_event: Union[types.Message,
                                       show_alert=True)
         return
 
+    if is_edit and not isinstance(target_message_obj, types.Message):
+        # InaccessibleMessage (too old for the bot to see) can't be edited,
+        # only replied to in its chat.
+        is_edit = False
+
+    menu_shown = True
     try:
         if is_edit:
             await target_message_obj.edit_text(text, reply_markup=reply_markup)
         else:
             await target_message_obj.answer(text, reply_markup=reply_markup)
-
-        if isinstance(target_event, types.CallbackQuery):
-            try:
-                await target_event.answer()
-            except Exception:
-                pass
-    except Exception as e_send_edit:
-        logging.warning(
-            f"Failed to send/edit main menu (user: {user_id}, is_edit: {is_edit}): {type(e_send_edit).__name__} - {e_send_edit}."
-        )
-        if is_edit and target_message_obj:
+    except TelegramBadRequest as e_bad_request:
+        error_text = str(e_bad_request).lower()
+        if "not modified" in error_text:
+            # The menu is already on screen; a new message would only spam the chat.
+            pass
+        elif is_edit and ("not found" in error_text
+                          or "can't be edited" in error_text
+                          or "no text in the message" in error_text):
             try:
                 await target_message_obj.answer(text, reply_markup=reply_markup)
-            except Exception as e_send_new:
-                logging.error(
+            except TelegramAPIError as e_send_new:
+                menu_shown = False
+                logger.error(
                     f"Also failed to send new main menu message for user {user_id}: {e_send_new}"
                 )
-        if isinstance(target_event, types.CallbackQuery):
-            try:
-                await target_event.answer(
-                    _("error_occurred_try_again") if is_edit else None)
-            except Exception:
-                pass
+        else:
+            menu_shown = False
+            logger.warning(
+                f"Failed to send/edit main menu (user: {user_id}, is_edit: {is_edit}): {e_bad_request}"
+            )
+    except TelegramAPIError as e_send_edit:
+        # Flood control is already retried by the session middleware, so
+        # resending here would only add pressure.
+        menu_shown = False
+        logger.warning(
+            f"Failed to send/edit main menu (user: {user_id}, is_edit: {is_edit}): {type(e_send_edit).__name__} - {e_send_edit}."
+        )
+
+    if isinstance(target_event, types.CallbackQuery):
+        _answer_in_background(
+            target_event,
+            None if menu_shown else _("error_occurred_try_again"))
 
 
 async def ensure_required_channel_subscription(
@@ -130,139 +203,134 @@ async def ensure_required_channel_subscription(
         i18n: Optional[JsonI18n],
         current_lang: str,
         session: AsyncSession,
-        db_user: Optional[User] = None) -> bool:
+        db_user: Optional[User],
+        now_utc: Optional[datetime] = None) -> bool:
     """
     Verify that the user is a member of the required channel (if configured).
     Returns True when access can proceed, False when user must subscribe first.
+    Callers pass the already loaded user (None if not persisted yet).
     """
     required_channel_id = settings.REQUIRED_CHANNEL_ID
     if not required_channel_id:
         return True
 
+    # Admins and already verified users are resolved without any I/O.
+    user_id = event.from_user.id
+    if user_id in settings.admin_ids_set:
+        return True
+
+    if not db_user:
+        logger.warning(
+            "Required channel check skipped because user %s is not persisted yet.",
+            user_id,
+        )
+        return True
+
+    if (db_user.channel_subscription_verified
+            and db_user.channel_subscription_verified_for
+            == required_channel_id):
+        return True
+
     if isinstance(event, types.CallbackQuery):
-        user_id = event.from_user.id
         bot_instance: Optional[Bot] = getattr(event, "bot", None)
         if bot_instance is None and event.message:
             bot_instance = event.message.bot
         message_obj: Optional[types.Message] = event.message
     else:
-        user_id = event.from_user.id
         bot_instance = event.bot if hasattr(event, "bot") else None
         message_obj = event
 
     if bot_instance is None:
-        logging.error(
+        logger.error(
             "Channel subscription check: bot instance missing for user %s.", user_id
         )
         return False
 
-    if user_id in settings.ADMIN_IDS:
-        return True
-
-    if db_user is None:
-        try:
-            db_user = await user_dal.get_user_by_id(session, user_id)
-        except Exception as fetch_error:
-            logging.error(
-                "Channel subscription check: failed to fetch user %s: %s",
-                user_id,
-                fetch_error,
-                exc_info=True,
-            )
-            return False
-
-    if not db_user:
-        logging.warning(
-            "Required channel check skipped because user %s is not persisted yet.",
-            user_id,
-        )
-        return True
-
-    if (db_user.channel_subscription_verified
-            and db_user.channel_subscription_verified_for
-            == required_channel_id):
-        return True
-
-    def translate(key: str, **kwargs) -> str:
-        if i18n:
-            return i18n.gettext(current_lang, key, **kwargs)
-        return key
+    translate = (i18n.translator(current_lang) if i18n else
+                 (lambda key, **kwargs: key))
 
-    now = datetime.now(timezone.utc)
+    now = now_utc or datetime.now(timezone.utc)
     is_member = False
     status_value = None
 
+    cache_hit, cached_status = membership_cache.get(required_channel_id, user_id)
+    if cache_hit:
+        # Result was already persisted when it was cached; skip API call and write.
+        if cached_status in _CHANNEL_MEMBER_STATUSES:
+            return True
+        return await _prompt_channel_subscription(event, settings, i18n,
+                                                  current_lang, message_obj)
+
     try:
         member = await bot_instance.get_chat_member(required_channel_id, user_id)
         status = getattr(member, "status", None)
         status_value = getattr(status, "value", status)
-        allowed_statuses = {"creator", "administrator", "member", "restricted"}
-        if status_value in allowed_statuses:
+        if status_value in _CHANNEL_MEMBER_STATUSES:
             is_member = True
     except TelegramBadRequest as bad_request:
-        logging.info(
+        logger.info(
             "Required channel check: user %s not subscribed (details: %s)",
             user_id,
             bad_request,
         )
     except TelegramForbiddenError as forbidden_error:
-        logging.error(
+        logger.warning(
             "Required channel check failed due to insufficient permissions: %s",
             forbidden_error,
         )
         error_text = translate("channel_subscription_check_failed")
         if isinstance(event, types.CallbackQuery):
-            try:
-                await event.answer(error_text, show_alert=True)
-            except Exception:
-                pass
+            _answer_in_background(event, error_text, show_alert=True)
             if message_obj:
-                try:
-                    await message_obj.answer(error_text)
-                except Exception:
-                    pass
+                await _safe_reply(message_obj, error_text)
         else:
-            await event.answer(error_text)
+            await _safe_reply(event, error_text)
         return False
     except TelegramAPIError as api_error:
-        logging.error(
+        # Expected during Bot API outages; tracebacks only when debugging.
+        logger.warning(
             "Required channel check failed for user %s: %s",
             user_id,
             api_error,
-            exc_info=True,
+            exc_info=logger.isEnabledFor(logging.DEBUG),
         )
         error_text = translate("channel_subscription_check_failed")
         if isinstance(event, types.CallbackQuery):
-            try:
-                await event.answer(error_text, show_alert=True)
-            except Exception:
-                pass
+            _answer_in_background(event, error_text, show_alert=True)
             if message_obj:
-                try:
-                    await message_obj.answer(error_text)
-                except Exception:
-                    pass
+                await _safe_reply(message_obj, error_text)
         else:
-            await event.answer(error_text)
+            await _safe_reply(event, error_text)
         return False
 
-    update_payload = {
-        "channel_subscription_checked_at": now,
-        "channel_subscription_verified_for": required_channel_id,
-        "channel_subscription_verified": is_member,
-    }
+    membership_cache.set(required_channel_id, user_id, status_value, is_member)
+
+    update_payload = None
+    if (db_user.channel_subscription_verified != is_member
+            or db_user.channel_subscription_verified_for
+            != required_channel_id):
+        update_payload = {
+            "channel_subscription_checked_at": now,
+            "channel_subscription_verified_for": required_channel_id,
+            "channel_subscription_verified": is_member,
+        }
+    elif (db_user.channel_subscription_checked_at is None
+          or now - db_user.channel_subscription_checked_at
+          > _CHANNEL_CHECK_REFRESH_INTERVAL):
+        update_payload = {"channel_subscription_checked_at": now}
     try:
-        await user_dal.update_user(session, user_id, update_payload)
+        if update_payload:
+            await user_dal.update_user_fast(session, user_id, update_payload)
     except Exception as update_error:
-        logging.error(
+        logger.warning(
             "Failed to persist channel verification result for user %s: %s",
             user_id,
             update_error,
-            exc_info=True,
+            exc_info=logger.isEnabledFor(logging.DEBUG),
         )
 
     if is_member:
-        logging.info(
+        logger.info(
             "User %s confirmed as member of required channel %s (status=%s).",
             user_id,
             required_channel_id,
@@ -270,56 +338,61 @@ async def ensure_required_channel_subscription(
         )
         return True
 
+    return await _prompt_channel_subscription(event, settings, i18n,
+                                              current_lang, message_obj)
+
+
+async def _prompt_channel_subscription(
+        event: Union[types.Message, types.CallbackQuery],
+        settings: Settings,
+        i18n: Optional[JsonI18n],
+        current_lang: str,
+        message_obj: Optional[types.Message]) -> bool:
+    user_id = event.from_user.id
     keyboard = (get_channel_subscription_keyboard(
         current_lang, i18n, settings.REQUIRED_CHANNEL_LINK
     )
                if i18n else None)
 
-    prompt_text = translate("channel_subscription_required")
+    prompt_text = (i18n.gettext(current_lang, "channel_subscription_required")
+                   if i18n else "channel_subscription_required")
 
     if isinstance(event, types.CallbackQuery):
         if keyboard and event.message:
             try:
                 await event.message.edit_text(prompt_text, reply_markup=keyboard)
             except Exception as edit_error:
-                logging.debug(
+                logger.debug(
                     "Failed to edit prompt message for user %s: %s",
                     user_id,
                     edit_error,
                 )
         if keyboard is None and message_obj:
-            try:
-                await message_obj.answer(prompt_text)
-            except Exception:
-                pass
-        try:
-            await event.answer(prompt_text, show_alert=True)
-        except Exception:
-            pass
+            await _safe_reply(message_obj, prompt_text)
+        _answer_in_background(event, prompt_text, show_alert=True)
     else:
-        await event.answer(prompt_text, reply_markup=keyboard)
+        await _safe_reply(event, prompt_text, reply_markup=keyboard)
 
     return False
 
 
 @router.message(CommandStart())
-@router.message(CommandStart(magic=F.args.regexp(r"^ref_((?:[uU][A-Za-z0-9]{9})|(?:[A-Za-z0-9]{9})|\d+)$").as_("ref_match")))
-@router.message(CommandStart(magic=F.args.regexp(r"^promo_(\w+)$").as_("promo_match")))
-@router.message(CommandStart(magic=F.args.regexp(r"^(?!ref_|promo_)([A-Za-z0-9_\-]{2,64})$").as_("ad_param_match")))
 async def start_command_handler(message: types.Message,
                                 state: FSMContext,
                                 settings: Settings,
                                 i18n_data: dict,
                                 subscription_service: SubscriptionService,
                                 session: AsyncSession,
-                                ref_match: Optional[re.Match] = None,
-                                promo_match: Optional[re.Match] = None,
-                                ad_param_match: Optional[re.Match] = None):
+                                notification_service: NotificationService,
+                                promo_code_service: PromoCodeService,
+                                command: Optional[CommandObject] = None,
+                                now_utc: Optional[datetime] = None,
+                                after_commit: Optional[List[Callable[[], Awaitable[Any]]]] = None):
+    now_utc = now_utc or datetime.now(timezone.utc)
     await state.clear()
     current_lang = i18n_data.get("current_language", settings.DEFAULT_LANGUAGE)
     i18n: Optional[JsonI18n] = i18n_data.get("i18n_instance")
-    _ = lambda key, **kwargs: i18n.gettext(current_lang, key, **kwargs
-                                           ) if i18n else key
+    _ = i18n.translator(current_lang) if i18n else (lambda key, **kwargs: key)
 
     user = message.from_user
     user_id = user.id
@@ -328,8 +401,12 @@ async def start_command_handler(message: types.Message,
     promo_code_to_apply: Optional[str] = None
     ad_start_param: Optional[str] = None
 
-    if ref_match:
-        raw_ref_value = ref_match.group(1)
+    start_args = command.args if command and command.args else ""
+    start_param_match = _START_PARAM_RE.match(start_args) if start_args else None
+    start_param_kind = start_param_match.lastgroup if start_param_match else None
+
+    if start_param_kind == "ref":
+        raw_ref_value = start_param_match.group("ref")
         if raw_ref_value.isdigit():
             if settings.LEGACY_REFS:
                 potential_referrer_id = int(raw_ref_value)
@@ -340,150 +417,122 @@ async def start_command_handler(message: types.Message,
             normalized_code = raw_ref_value.strip()
             if normalized_code and normalized_code[0].lower() == "u":
                 normalized_code = normalized_code[1:]
-            ref_user = None
+            ref_user_id = None
             if normalized_code:
-                ref_user = await user_dal.get_user_by_referral_code(
+                ref_user_id = await user_dal.get_user_id_by_referral_code(
                     session, normalized_code)
-            if ref_user and ref_user.user_id != user_id:
-                referred_by_user_id = ref_user.user_id
-    elif promo_match:
-        promo_code_to_apply = promo_match.group(1)
-        logging.info(f"User {user_id} started with promo code: {promo_code_to_apply}")
-    elif ad_param_match:
-        ad_start_param = ad_param_match.group(1)
-        logging.info(f"User {user_id} started with ad start param: {ad_start_param}")
+            if ref_user_id and ref_user_id != user_id:
+                referred_by_user_id = ref_user_id
+    elif start_param_kind == "promo":
+        promo_code_to_apply = start_param_match.group("promo")
+        logger.info(f"User {user_id} started with promo code: {promo_code_to_apply}")
+    elif start_param_kind == "ad":
+        ad_start_param = start_param_match.group("ad")
+        logger.info(f"User {user_id} started with ad start param: {ad_start_param}")
 
     sanitized_username = sanitize_username(user.username)
     sanitized_first_name = sanitize_display_name(user.first_name)
     sanitized_last_name = sanitize_display_name(user.last_name)
 
-    db_user = await user_dal.get_user_by_id(session, user_id)
-    if not db_user:
-        user_data_to_create = {
-            "user_id": user_id,
-            "username": sanitized_username,
-            "first_name": sanitized_first_name,
-            "last_name": sanitized_last_name,
-            "language_code": current_lang,
-            "referred_by_id": referred_by_user_id,
-            "registration_date": datetime.now(timezone.utc)
-        }
-        try:
-            db_user, created = await user_dal.create_user(session, user_data_to_create)
-
-            if created:
-                try:
-                    await session.commit()
-                except Exception as commit_error:
-                    await session.rollback()
-                    logging.error(
-                        f"Failed to commit new user {user_id}: {commit_error}",
-                        exc_info=True,
-                    )
-                    await message.answer(_("error_occurred_processing_request"))
-                    return
-
-                logging.info(
-                    f"New user {user_id} added to session. Referred by: {referred_by_user_id or 'N/A'}."
+    user_data_on_start = {
+        "user_id": user_id,
+        "username": sanitized_username,
+        "first_name": sanitized_first_name,
+        "last_name": sanitized_last_name,
+        "language_code": current_lang,
+        "referred_by_id": referred_by_user_id,
+        "registration_date": now_utc
+    }
+    try:
+        db_user, created = await user_dal.upsert_user_on_start(
+            session, user_data_on_start)
+    except Exception as e_upsert:
+        logger.warning(
+            "Failed to upsert user %s on start: %s",
+            user_id,
+            e_upsert,
+            exc_info=logger.isEnabledFor(logging.DEBUG),
+        )
+        await _safe_reply(message, _("error_occurred_processing_request"))
+        return
+
+    # DBSessionMiddleware commits once after the handler; optional steps below
+    # run in savepoints and replies are guarded so their failures never undo
+    # the user row.
+    if created:
+        logger.info(
+            f"New user {user_id} added to session. Referred by: {referred_by_user_id or 'N/A'}."
+        )
+
+        async def _notify_new_user() -> None:
+            try:
+                await notification_service.notify_new_user_registration(
+                    user_id=user_id,
+                    username=sanitized_username,
+                    first_name=sanitized_first_name,
+                    referred_by_id=referred_by_user_id
                 )
+            except Exception as e:
+                logger.error(f"Failed to send new user notification: {e}")
 
-                # Send notification about new user registration
-                try:
-                    from bot.services.notification_service import NotificationService
-                    notification_service = NotificationService(message.bot, settings, i18n)
-                    await notification_service.notify_new_user_registration(
-                        user_id=user_id,
-                        username=sanitized_username,
-                        first_name=sanitized_first_name,
-                        referred_by_id=referred_by_user_id
-                    )
-                except Exception as e:
-                    logging.error(f"Failed to send new user notification: {e}")
-        except Exception as e_create:
-
-            logging.error(
-                f"Failed to add new user {user_id} to session: {e_create}",
-                exc_info=True)
-            await message.answer(_("error_occurred_processing_request"))
-            return
-    else:
-        update_payload = {}
-        if db_user.language_code != current_lang:
-            update_payload["language_code"] = current_lang
+        # Admins hear about the user only once the row is actually committed.
+        await _defer_until_commit(after_commit, _notify_new_user)
+    elif referred_by_user_id and db_user.referred_by_id is None:
         # Set referral only if not already set AND user is not currently active.
         # This allows previously subscribed but currently inactive users to be attributed.
-        if referred_by_user_id and db_user.referred_by_id is None:
-            try:
-                is_active_now = await subscription_service.has_active_subscription(session, user_id)
-            except Exception:
-                is_active_now = False
-            if not is_active_now:
-                update_payload["referred_by_id"] = referred_by_user_id
-        if sanitized_username != db_user.username:
-            update_payload["username"] = sanitized_username
-        if sanitized_first_name != db_user.first_name:
-            update_payload["first_name"] = sanitized_first_name
-        if sanitized_last_name != db_user.last_name:
-            update_payload["last_name"] = sanitized_last_name
-
-        if update_payload:
+        try:
+            is_active_now = await subscription_service.has_active_subscription(session, user_id)
+        except Exception:
+            is_active_now = False
+        if not is_active_now:
             try:
-                await user_dal.update_user(session, user_id, update_payload)
-
-                logging.info(
-                    f"Updated existing user {user_id} in session: {update_payload}"
+                await user_dal.update_user(
+                    session, user_id, {"referred_by_id": referred_by_user_id})
+                logger.info(
+                    f"Attributed existing user {user_id} to referrer {referred_by_user_id}"
                 )
             except Exception as e_update:
-
-                logging.error(
-                    f"Failed to update existing user {user_id} in session: {e_update}",
-                    exc_info=True)
+                logger.warning(
+                    "Failed to update existing user %s in session: %s",
+                    user_id,
+                    e_update,
+                    exc_info=logger.isEnabledFor(logging.DEBUG),
+                )
 
     # Attribute user to ad campaign if start param provided
     if ad_start_param:
         try:
-            from db.dal import ad_dal as _ad_dal
-            campaign = await _ad_dal.get_campaign_by_start_param(session, ad_start_param)
-            if campaign and campaign.is_active:
-                await _ad_dal.ensure_attribution(session, user_id=user_id, campaign_id=campaign.ad_campaign_id)
-                await session.commit()
+            async with session.begin_nested():
+                campaign = await ad_dal.get_campaign_by_start_param(session, ad_start_param)
+                if campaign and campaign.is_active:
+                    await ad_dal.ensure_attribution(session, user_id=user_id, campaign_id=campaign.ad_campaign_id)
         except Exception as e_attr:
-            logging.error(f"Failed to attribute user {user_id} to ad '{ad_start_param}': {e_attr}")
-            try:
-                await session.rollback()
-            except Exception:
-                pass
+            logger.error(f"Failed to attribute user {user_id} to ad '{ad_start_param}': {e_attr}")
 
     if not await ensure_required_channel_subscription(message, settings, i18n,
                                                       current_lang, session,
-                                                      db_user):
+                                                      db_user, now_utc):
         return
 
     # Check if user has accepted terms
-    if not db_user.terms_accepted:
+    if not has_accepted_current_terms(db_user, settings.TERMS_VERSION):
         terms_message_text = _("terms_acceptance_required")
         keyboard = get_terms_acceptance_keyboard(
             current_lang, i18n, settings.TERMS_DOCUMENTS_URL)
-        await message.answer(terms_message_text, reply_markup=keyboard)
+        await _safe_reply(message, terms_message_text, reply_markup=keyboard)
         return
 
-    # Send welcome message if not disabled
-    if not settings.DISABLE_WELCOME_MESSAGE:
-        await message.answer(_(key="welcome", user_name=hd.quote(user.full_name)))
-
     # Auto-apply promo code if provided via start parameter
     if promo_code_to_apply:
+        promo_savepoint = await session.begin_nested()
         try:
-            from bot.services.promo_code_service import PromoCodeService
-            promo_code_service = PromoCodeService(settings, subscription_service, message.bot, i18n)
-
             success, result = await promo_code_service.apply_promo_code(
                 session, user_id, promo_code_to_apply, current_lang
             )
 
             if success:
-                await session.commit()
-                logging.info(f"Auto-applied promo code '{promo_code_to_apply}' for user {user_id}")
+                await promo_savepoint.commit()
+                logger.info(f"Auto-applied promo code '{promo_code_to_apply}' for user {user_id}")
 
                 # Get updated subscription details
                 active = await subscription_service.get_active_subscription_details(session, user_id)
@@ -497,8 +546,11 @@ async def start_command_handler(message: types.Message,
                     end_date=(new_end_date.strftime("%d.%m.%Y %H:%M:%S") if new_end_date else "N/A"),
                     config_link=config_link,
                 )
+                if not settings.DISABLE_WELCOME_MESSAGE:
+                    promo_success_text = (
+                        _(key="welcome", user_name=hd.quote(user.full_name))
+                        + "\n\n" + promo_success_text)
 
-                from bot.keyboards.inline.user_keyboards import get_connect_and_main_keyboard
                 await message.answer(
                     promo_success_text,
                     reply_markup=get_connect_and_main_keyboard(current_lang, i18n, settings, config_link),
@@ -508,20 +560,23 @@ async def start_command_handler(message: types.Message,
                 # Don't show main menu if promo was successfully applied
                 return
             else:
-                await session.rollback()
-                logging.warning(f"Failed to auto-apply promo code '{promo_code_to_apply}' for user {user_id}: {result}")
+                await promo_savepoint.rollback()
+                logger.warning(f"Failed to auto-apply promo code '{promo_code_to_apply}' for user {user_id}: {result}")
                 # Continue to show main menu if promo failed
 
         except Exception as e:
-            logging.error(f"Error auto-applying promo code '{promo_code_to_apply}' for user {user_id}: {e}")
-            await session.rollback()
+            logger.error(f"Error auto-applying promo code '{promo_code_to_apply}' for user {user_id}: {e}")
+            if promo_savepoint.is_active:
+                await promo_savepoint.rollback()
 
     await send_main_menu(message,
                          settings,
                          i18n_data,
                          subscription_service,
                          session,
-                         is_edit=False)
+                         is_edit=False,
+                         prepend_welcome=not settings.DISABLE_WELCOME_MESSAGE,
+                         db_user=db_user)
 
 
 @router.callback_query(F.data == "channel_subscription:verify")
@@ -530,14 +585,19 @@ async def verify_channel_subscription_callback(
         settings: Settings,
         i18n_data: dict,
         subscription_service: SubscriptionService,
-        session: AsyncSession):
+        session: AsyncSession,
+        db_user: Optional[User] = None,
+        now_utc: Optional[datetime] = None):
     current_lang = i18n_data.get("current_language", settings.DEFAULT_LANGUAGE)
     i18n: Optional[JsonI18n] = i18n_data.get("i18n_instance")
 
-    db_user = await user_dal.get_user_by_id(session, callback.from_user.id)
+    # Explicit "I subscribed" click must not be answered from a stale cache entry.
+    if settings.REQUIRED_CHANNEL_ID:
+        membership_cache.invalidate(settings.REQUIRED_CHANNEL_ID,
+                                    callback.from_user.id)
 
     verified = await ensure_required_channel_subscription(
-        callback, settings, i18n, current_lang, session, db_user)
+        callback, settings, i18n, current_lang, session, db_user, now_utc)
     if not verified:
         return
 
@@ -545,34 +605,21 @@ async def verify_channel_subscription_callback(
         current_lang = db_user.language_code
         i18n_data["current_language"] = current_lang
 
-    if i18n:
-        _ = lambda key, **kwargs: i18n.gettext(current_lang, key, **kwargs)
-    else:
-        _ = lambda key, **kwargs: key
-
-    if not settings.DISABLE_WELCOME_MESSAGE:
-        welcome_text = _(key="welcome",
-                         user_name=hd.quote(callback.from_user.full_name))
-        if callback.message:
-            await callback.message.answer(welcome_text)
-        else:
-            fallback_bot: Optional[Bot] = getattr(callback, "bot", None)
-            if fallback_bot:
-                await fallback_bot.send_message(callback.from_user.id,
-                                                welcome_text)
+    _ = i18n.translator(current_lang) if i18n else (lambda key, **kwargs: key)
 
-    try:
-        await callback.answer(_(key="channel_subscription_verified_success"),
-                              show_alert=True)
-    except Exception:
-        pass
+    # Awaited so the alert is not pre-empted by send_main_menu's plain answer.
+    await _safe_ans(callback,
+                    _(key="channel_subscription_verified_success"),
+                    show_alert=True)
 
     await send_main_menu(callback,
                          settings,
                          i18n_data,
                          subscription_service,
                          session,
-                         is_edit=bool(callback.message))
+                         is_edit=bool(callback.message),
+                         prepend_welcome=not settings.DISABLE_WELCOME_MESSAGE,
+                         db_user=db_user)
 
 
 @router.message(Command("language"))
@@ -584,8 +631,7 @@ async def language_command_handler(
 ):
     current_lang = i18n_data.get("current_language", settings.DEFAULT_LANGUAGE)
     i18n: Optional[JsonI18n] = i18n_data.get("i18n_instance")
-    _ = lambda key, **kwargs: i18n.gettext(current_lang, key, **kwargs
-                                           ) if i18n else key
+    _ = i18n.translator(current_lang) if i18n else (lambda key, **kwargs: key)
 
     text_to_send = _(key="choose_language")
     reply_markup = get_language_selection_keyboard(i18n, current_lang)
@@ -635,16 +681,16 @@ async def select_language_callback_handler(
         if updated:
 
             i18n_data["current_language"] = lang_code
-            _ = lambda key, **kwargs: i18n.gettext(lang_code, key, **kwargs)
+            _ = i18n.translator(lang_code)
             await callback.answer(_(key="language_set_alert"))
-            logging.info(
+            logger.info(
                 f"User {user_id} language updated to {lang_code} in session.")
         else:
             await callback.answer("Could not set language.", show_alert=True)
             return
     except Exception as e_lang_update:
 
-        logging.error(
+        logger.error(
             f"Error updating lang for user {user_id}: {e_lang_update}",
             exc_info=True)
         await callback.answer("Error setting language.", show_alert=True)
@@ -657,66 +703,101 @@ async def select_language_callback_handler(
                          is_edit=True)
 
 
+_ACTION_DISPATCH: Dict[str, Callable[..., Awaitable[Any]]] = {}
+
+
+def register_actions() -> None:
+    """Fill the main_action dispatch table.
+
+    Sibling handler modules import send_main_menu from here, so this runs
+    once from the package __init__ after every user handler module is loaded.
+    """
+    from . import subscription as user_subscription_handlers
+    from . import referral as user_referral_handlers
+    from . import promo_user as user_promo_handlers
+    from . import trial_handler as user_trial_handlers
+
+    _ACTION_DISPATCH.update({
+        "subscribe": lambda callback, i18n_data, settings, session, **kwargs: (
+            user_subscription_handlers.display_subscription_options(
+                callback, i18n_data, settings, session)),
+        "my_subscription": lambda callback, i18n_data, settings, panel_service,
+                                  subscription_service, session, bot, **kwargs: (
+            user_subscription_handlers.my_subscription_command_handler(
+                callback, i18n_data, settings, panel_service,
+                subscription_service, session, bot)),
+        "my_devices": lambda callback, i18n_data, settings, panel_service,
+                             subscription_service, session, bot, **kwargs: (
+            user_subscription_handlers.my_devices_command_handler(
+                callback, i18n_data, settings, panel_service,
+                subscription_service, session, bot)),
+        "referral": lambda callback, settings, i18n_data, referral_service,
+                           bot, session, **kwargs: (
+            user_referral_handlers.referral_command_handler(
+                callback, settings, i18n_data, referral_service, bot, session)),
+        "apply_promo": lambda callback, state, i18n_data, settings, session,
+                              **kwargs: (
+            user_promo_handlers.prompt_promo_code_input(
+                callback, state, i18n_data, settings, session)),
+        "request_trial": lambda callback, settings, i18n_data,
+                                subscription_service, session, **kwargs: (
+            user_trial_handlers.request_trial_confirmation_handler(
+                callback, settings, i18n_data, subscription_service, session)),
+        "language": lambda callback, i18n_data, settings, **kwargs: (
+            language_command_handler(callback, i18n_data, settings)),
+        "back_to_main": partial(_back_to_main_action, is_edit=True),
+        "back_to_main_keep": partial(_back_to_main_action, is_edit=False),
+    })
+
+
+async def _back_to_main_action(callback: types.CallbackQuery, settings: Settings,
+                               i18n_data: dict,
+                               subscription_service: SubscriptionService,
+                               session: AsyncSession, db_user: Optional[User],
+                               is_edit: bool, **kwargs):
+    await send_main_menu(callback,
+                         settings,
+                         i18n_data,
+                         subscription_service,
+                         session,
+                         is_edit=is_edit,
+                         db_user=db_user)
+
+
 @router.callback_query(F.data.startswith("main_action:"))
 async def main_action_callback_handler(
         callback: types.CallbackQuery, state: FSMContext, settings: Settings,
         i18n_data: dict, bot: Bot, subscription_service: SubscriptionService,
         referral_service: ReferralService, panel_service: PanelApiService,
-        promo_code_service: PromoCodeService, session: AsyncSession):
+        promo_code_service: PromoCodeService, session: AsyncSession,
+        db_user: Optional[User] = None):
     action = callback.data.split(":")[1]
-    user_id = callback.from_user.id
-
-    from . import subscription as user_subscription_handlers
-    from . import referral as user_referral_handlers
-    from . import promo_user as user_promo_handlers
-    from . import trial_handler as user_trial_handlers
 
     if not callback.message:
         await callback.answer("Error: message context lost.", show_alert=True)
         return
 
-    if action == "subscribe":
-        await user_subscription_handlers.display_subscription_options(
-            callback, i18n_data, settings, session)
-    elif action == "my_subscription":
-        await user_subscription_handlers.my_subscription_command_handler(
-            callback, i18n_data, settings, panel_service, subscription_service,
-            session, bot)
-    elif action == "my_devices":
-        await user_subscription_handlers.my_devices_command_handler(
-            callback, i18n_data, settings, panel_service, subscription_service,
-            session, bot)
-    elif action == "referral":
-        await user_referral_handlers.referral_command_handler(
-            callback, settings, i18n_data, referral_service, bot, session)
-    elif action == "apply_promo":
-        await user_promo_handlers.prompt_promo_code_input(
-            callback, state, i18n_data, settings, session)
-    elif action == "request_trial":
-        await user_trial_handlers.request_trial_confirmation_handler(
-            callback, settings, i18n_data, subscription_service, session)
-    elif action == "language":
-
-        await language_command_handler(callback, i18n_data, settings)
-    elif action == "back_to_main":
-        await send_main_menu(callback,
-                             settings,
-                             i18n_data,
-                             subscription_service,
-                             session,
-                             is_edit=True)
-    elif action == "back_to_main_keep":
-        await send_main_menu(callback,
-                             settings,
-                             i18n_data,
-                             subscription_service,
-                             session,
-                             is_edit=False)
-    else:
+    action_handler = _ACTION_DISPATCH.get(action)
+    if action_handler is None:
         i18n: Optional[JsonI18n] = i18n_data.get("i18n_instance")
-        _ = lambda key, **kwargs: i18n.gettext(
-            i18n_data.get("current_language"), key, **kwargs) if i18n else key
+        _ = (i18n.translator(i18n_data.get("current_language"))
+             if i18n else (lambda key, **kwargs: key))
         await callback.answer(_("main_menu_unknown_action"), show_alert=True)
+        return
+
+    await action_handler(
+        callback=callback,
+        state=state,
+        settings=settings,
+        i18n_data=i18n_data,
+        bot=bot,
+        subscription_service=subscription_service,
+        referral_service=referral_service,
+        panel_service=panel_service,
+        promo_code_service=promo_code_service,
+        session=session,
+        db_user=db_user,
+    )
 
 
 @router.callback_query(F.data == "terms:accept")
@@ -725,16 +806,18 @@ async def terms_accept_callback_handler(
         settings: Settings,
         i18n_data: dict,
         subscription_service: SubscriptionService,
-        session: AsyncSession):
+        session: AsyncSession,
+        db_user: Optional[User] = None,
+        now_utc: Optional[datetime] = None,
+        after_commit: Optional[List[Callable[[], Awaitable[Any]]]] = None):
     current_lang = i18n_data.get("current_language", settings.DEFAULT_LANGUAGE)
     i18n: Optional[JsonI18n] = i18n_data.get("i18n_instance")
-    _ = lambda key, **kwargs: i18n.gettext(current_lang, key, **kwargs
-                                           ) if i18n else key
+    _ = i18n.translator(current_lang) if i18n else (lambda key, **kwargs: key)
 
     user_id = callback.from_user.id
 
     # Update user to mark terms as accepted
-    now = datetime.now(timezone.utc)
+    now = now_utc or datetime.now(timezone.utc)
     update_payload = {
         "terms_accepted": True,
         "terms_accepted_at": now,
@@ -742,38 +825,56 @@ async def terms_accept_callback_handler(
     }
 
     try:
-        await user_dal.update_user(session, user_id, update_payload)
-        await session.commit()
-        logging.info(f"User {user_id} accepted terms (version: {settings.TERMS_VERSION})")
+        updated = await user_dal.update_user_fast(session, user_id,
+                                                  update_payload)
     except Exception as e_update:
-        logging.error(
+        logger.error(
             f"Failed to update terms acceptance for user {user_id}: {e_update}",
             exc_info=True)
         await session.rollback()
         await callback.answer(_("error_occurred_try_again"), show_alert=True)
         return
 
-    # Show success message
-    success_text = _("terms_accepted_success")
-    await callback.answer(success_text, show_alert=True)
+    if not updated:
+        logger.warning(f"Terms acceptance from unregistered user {user_id}")
+        await callback.answer(_("error_occurred_try_again"), show_alert=True)
+        return
+
+    async def _prime_terms_cache() -> None:
+        mark_terms_accepted(user_id)
+
+    # Only prime the middleware cache once the acceptance is committed.
+    await _defer_until_commit(after_commit, _prime_terms_cache)
+    logger.info(f"User {user_id} accepted terms (version: {settings.TERMS_VERSION})")
 
-    # Send welcome message if not disabled
+    # Show success message; a failed answer must not roll back the acceptance.
+    success_text = _("terms_accepted_success")
+    await _safe_ans(callback, success_text, show_alert=True)
+
+    # The main menu edits the terms message in place, so the welcome message
+    # (which never touches the session) can be sent concurrently.
+    sends = [
+        send_main_menu(callback,
+                       settings,
+                       i18n_data,
+                       subscription_service,
+                       session,
+                       is_edit=bool(callback.message),
+                       db_user=db_user)
+    ]
     if not settings.DISABLE_WELCOME_MESSAGE:
+        welcome_text = _(key="welcome",
+                         user_name=hd.quote(callback.from_user.full_name))
         if callback.message:
-            await callback.message.answer(_(key="welcome",
-                                            user_name=hd.quote(callback.from_user.full_name)))
+            sends.append(callback.message.answer(welcome_text))
         else:
-            await callback.bot.send_message(
-                user_id, _(key="welcome",
-                          user_name=hd.quote(callback.from_user.full_name)))
+            sends.append(callback.bot.send_message(user_id, welcome_text))
 
-    # Show main menu
-    await send_main_menu(callback,
-                         settings,
-                         i18n_data,
-                         subscription_service,
-                         session,
-                         is_edit=bool(callback.message))
+    results = await asyncio.gather(*sends, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning(
+                "Post-terms message failed for user %s: %s", user_id, result)
 
 
 @router.callback_query(F.data == "terms:decline")
@@ -782,8 +883,7 @@ async def terms_decline_callback_handler(
         i18n_data: dict):
     current_lang = i18n_data.get("current_language", "ru")
     i18n: Optional[JsonI18n] = i18n_data.get("i18n_instance")
-    _ = lambda key, **kwargs: i18n.gettext(current_lang, key, **kwargs
-                                           ) if i18n else key
+    _ = i18n.translator(current_lang) if i18n else (lambda key, **kwargs: key)
 
     decline_text = _("terms_declined_message")
     await callback.answer(decline_text, show_alert=True)
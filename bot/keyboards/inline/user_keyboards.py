@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
 from aiogram.types import InlineKeyboardMarkup, WebAppInfo
 from typing import Dict, Optional, List, Tuple
@@ -10,10 +12,30 @@ def get_main_menu_inline_keyboard(
         i18n_instance,
         settings: Settings,
         show_trial_button: bool = False) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    return _build_main_menu_inline_keyboard(
+        lang,
+        i18n_instance,
+        show_trial_button and settings.TRIAL_ENABLED,
+        settings.SERVER_STATUS_URL,
+        settings.SUPPORT_LINK,
+        settings.TERMS_OF_SERVICE_URL,
+    )
+
+
+# Markups below are memoized per language and the settings that shape them;
+# callers must treat the returned objects as read-only.
+@lru_cache(maxsize=128)
+def _build_main_menu_inline_keyboard(
+        lang: str,
+        i18n_instance,
+        show_trial_button: bool,
+        server_status_url: Optional[str],
+        support_link: Optional[str],
+        terms_of_service_url: Optional[str]) -> InlineKeyboardMarkup:
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
 
-    if show_trial_button and settings.TRIAL_ENABLED:
+    if show_trial_button:
         builder.row(
             InlineKeyboardButton(text=_(key="menu_activate_trial_button"),
                                  callback_data="main_action:request_trial"))
@@ -40,33 +62,33 @@ def get_main_menu_inline_keyboard(
         text=_(key="menu_language_settings_inline"),
         callback_data="main_action:language")
     status_button_list = []
-    if settings.SERVER_STATUS_URL:
+    if server_status_url:
         status_button_list.append(
             InlineKeyboardButton(text=_(key="menu_server_status_button"),
-                                 url=settings.SERVER_STATUS_URL))
+                                 url=server_status_url))
 
     if status_button_list:
         builder.row(language_button, *status_button_list)
     else:
         builder.row(language_button)
 
-    if settings.SUPPORT_LINK:
+    if support_link:
         builder.row(
             InlineKeyboardButton(text=_(key="menu_support_button"),
-                                 url=settings.SUPPORT_LINK))
+                                 url=support_link))
 
-    if settings.TERMS_OF_SERVICE_URL:
+    if terms_of_service_url:
         builder.row(
             InlineKeyboardButton(text=_(key="menu_terms_button"),
-                                 url=settings.TERMS_OF_SERVICE_URL))
+                                 url=terms_of_service_url))
 
     return builder.as_markup()
 
 
+@lru_cache(maxsize=128)
 def get_language_selection_keyboard(i18n_instance,
                                     current_lang: str) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(current_lang, key, **kwargs
-                                                    )
+    _ = i18n_instance.translator(current_lang)
     builder = InlineKeyboardBuilder()
     builder.button(text=f"🇬🇧 English {'✅' if current_lang == 'en' else ''}",
                    callback_data="set_lang_en")
@@ -80,7 +102,7 @@ def get_language_selection_keyboard(i18n_instance,
 
 def get_trial_confirmation_keyboard(lang: str,
                                     i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.button(text=_(key="trial_confirm_activate_button"),
                    callback_data="trial_action:confirm_activate")
@@ -93,7 +115,7 @@ def get_trial_confirmation_keyboard(lang: str,
 def get_subscription_options_keyboard(subscription_options: Dict[
     int, Optional[int]], currency_symbol_val: str, lang: str,
                                       i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     if subscription_options:
         for months, price in subscription_options.items():
@@ -116,7 +138,7 @@ def get_payment_method_keyboard(months: int, price: float,
                                 stars_price: Optional[int],
                                 currency_symbol_val: str, lang: str,
                                 i18n_instance, settings: Settings) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     if settings.FREEKASSA_ENABLED:
         builder.button(text=_("pay_with_sbp_button"),
@@ -144,7 +166,7 @@ def get_payment_url_keyboard(payment_url: str,
                              back_callback: Optional[str] = None,
                              back_text_key: str = "back_to_main_menu_button"
                              ) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.button(text=_(key="pay_button"), url=payment_url)
     if back_callback:
@@ -164,7 +186,7 @@ def get_yk_autopay_choice_keyboard(
     has_saved_cards: bool = True,
 ) -> InlineKeyboardMarkup:
     """Keyboard for choosing between saved card charge or new card payment when auto-renew is enabled."""
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     price_str = str(price)
     if has_saved_cards:
@@ -198,7 +220,7 @@ def get_yk_saved_cards_keyboard(
     page: int = 0,
 ) -> InlineKeyboardMarkup:
     """Paginated keyboard for selecting a saved YooKassa card."""
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     per_page = 5
     total = len(cards)
@@ -249,7 +271,7 @@ def get_yk_saved_cards_keyboard(
 
 def get_referral_link_keyboard(lang: str,
                                i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.button(text=_(key="referral_share_message_button"),
                    callback_data="referral_action:share_message")
@@ -262,7 +284,7 @@ def get_referral_link_keyboard(lang: str,
 def get_back_to_main_menu_markup(lang: str,
                                  i18n_instance,
                                  callback_data: Optional[str] = None) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     if callback_data:
         builder.button(text=_(key="back_to_main_menu_button"),
@@ -274,7 +296,7 @@ def get_back_to_main_menu_markup(lang: str,
 
 
 def get_subscribe_only_markup(lang: str, i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.button(text=_(key="menu_subscribe_inline"),
                    callback_data="main_action:subscribe")
@@ -285,12 +307,13 @@ def get_user_banned_keyboard(support_link: Optional[str], lang: str,
                              i18n_instance) -> Optional[InlineKeyboardMarkup]:
     if not support_link:
         return None
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.button(text=_(key="menu_support_button"), url=support_link)
     return builder.as_markup()
 
 
+@lru_cache(maxsize=128)
 def get_channel_subscription_keyboard(
         lang: str,
         i18n_instance,
@@ -302,7 +325,7 @@ def get_channel_subscription_keyboard(
     if i18n_instance is None:
         return None
 
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
 
     has_buttons = False
@@ -335,7 +358,7 @@ def get_connect_and_main_keyboard(
         config_link: Optional[str],
         preserve_message: bool = False) -> InlineKeyboardMarkup:
     """Keyboard with a connect button and a back to main menu button."""
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
 
     if settings.SUBSCRIPTION_MINI_APP_URL:
@@ -370,7 +393,7 @@ def get_connect_and_main_keyboard(
 
 def get_payment_methods_manage_keyboard(lang: str, i18n_instance, has_card: bool) -> InlineKeyboardMarkup:
     """Deprecated in favor of get_payment_methods_list_keyboard. Kept for backward compatibility."""
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.row(
         InlineKeyboardButton(text=_(key="payment_method_bind_button"), callback_data="pm:bind")
@@ -392,7 +415,7 @@ def get_payment_methods_list_keyboard(
     cards: list of tuples (payment_method_id, display_title)
     page: 0-based page index
     """
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     per_page = 5
     total = len(cards)
@@ -419,7 +442,7 @@ def get_payment_methods_list_keyboard(
 
 
 def get_payment_method_delete_confirm_keyboard(pm_id: str, lang: str, i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.row(
         InlineKeyboardButton(text=_(key="yes_button"), callback_data=f"pm:delete:{pm_id}"),
@@ -429,7 +452,7 @@ def get_payment_method_delete_confirm_keyboard(pm_id: str, lang: str, i18n_insta
 
 
 def get_payment_method_details_keyboard(pm_id: str, lang: str, i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.row(
         InlineKeyboardButton(text=_(key="payment_method_tx_history_title"), callback_data=f"pm:history:{pm_id}")
@@ -444,7 +467,7 @@ def get_payment_method_details_keyboard(pm_id: str, lang: str, i18n_instance) ->
 
 
 def get_bind_url_keyboard(bind_url: str, lang: str, i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.button(text=_(key="payment_method_bind_button"), url=bind_url)
     builder.button(text=_(key="back_to_main_menu_button"), callback_data="pm:manage")
@@ -453,14 +476,14 @@ def get_bind_url_keyboard(bind_url: str, lang: str, i18n_instance) -> InlineKeyb
 
 
 def get_back_to_payment_methods_keyboard(lang: str, i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.row(InlineKeyboardButton(text=_(key="back_to_main_menu_button"), callback_data="pm:list:0"))
     return builder.as_markup()
 
 
 def get_back_to_payment_method_details_keyboard(pm_id: str, lang: str, i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     # Back one step: return to specific payment method details
     builder.row(InlineKeyboardButton(text=_(key="back_to_main_menu_button"), callback_data=f"pm:view:{pm_id}"))
@@ -468,7 +491,7 @@ def get_back_to_payment_method_details_keyboard(pm_id: str, lang: str, i18n_inst
 
 
 def get_autorenew_cancel_keyboard(lang: str, i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.row(
         InlineKeyboardButton(text=_(key="autorenew_disable_button"), callback_data="autorenew:cancel")
@@ -480,7 +503,7 @@ def get_autorenew_cancel_keyboard(lang: str, i18n_instance) -> InlineKeyboardMar
 
 
 def get_autorenew_confirm_keyboard(enable: bool, sub_id: int, lang: str, i18n_instance) -> InlineKeyboardMarkup:
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
     builder.row(
         InlineKeyboardButton(text=_(key="yes_button"), callback_data=f"autorenew:confirm:{sub_id}:{1 if enable else 0}"),
@@ -489,6 +512,7 @@ def get_autorenew_confirm_keyboard(enable: bool, sub_id: int, lang: str, i18n_in
     return builder.as_markup()
 
 
+@lru_cache(maxsize=128)
 def get_terms_acceptance_keyboard(
         lang: str,
         i18n_instance,
@@ -497,7 +521,7 @@ def get_terms_acceptance_keyboard(
     if i18n_instance is None:
         return None
 
-    _ = lambda key, **kwargs: i18n_instance.gettext(lang, key, **kwargs)
+    _ = i18n_instance.translator(lang)
     builder = InlineKeyboardBuilder()
 
     # Button to accept terms
@@ -36,7 +36,7 @@ class ActionLoggerMiddleware(BaseMiddleware):
             user_id = event_user.id
             telegram_username = event_user.username
             telegram_first_name = event_user.first_name
-            if user_id in self.settings.ADMIN_IDS:
+            if user_id in self.settings.admin_ids_set:
                 is_admin_event_flag = True
 
         raw_update_snippet = None
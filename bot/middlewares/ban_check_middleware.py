@@ -30,12 +30,15 @@ class BanCheckMiddleware(BaseMiddleware):
         if not event_user:
             return await handler(event, data)
 
-        if event_user.id in self.settings.ADMIN_IDS:
+        if event_user.id in self.settings.admin_ids_set:
             return await handler(event, data)
 
         try:
-            db_user_model = await user_dal.get_user_by_id(
-                session, event_user.id)
+            if "db_user" in data:
+                db_user_model = data["db_user"]
+            else:
+                db_user_model = await user_dal.get_user_by_id(
+                    session, event_user.id)
         except Exception as e_db:
             logging.error(
                 f"BanCheckMiddleware: DB error fetching user {event_user.id}: {e_db}",
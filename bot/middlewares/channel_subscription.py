@@ -37,7 +37,7 @@ class ChannelSubscriptionMiddleware(BaseMiddleware):
             return await handler(event, data)
 
         event_user = data.get("event_from_user")
-        if not event_user or event_user.id in self.settings.ADMIN_IDS:
+        if not event_user or event_user.id in self.settings.admin_ids_set:
             return await handler(event, data)
 
         callback_query = event.callback_query
@@ -59,7 +59,10 @@ class ChannelSubscriptionMiddleware(BaseMiddleware):
 
         session: AsyncSession = data["session"]
         try:
-            db_user = await user_dal.get_user_by_id(session, event_user.id)
+            if "db_user" in data:
+                db_user = data["db_user"]
+            else:
+                db_user = await user_dal.get_user_by_id(session, event_user.id)
         except Exception as db_error:
             logging.error(
                 "ChannelSubscriptionMiddleware: failed to fetch user %s: %s",
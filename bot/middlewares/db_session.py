@@ -1,5 +1,5 @@
 import logging
-from typing import Callable, Dict, Any, Awaitable
+from typing import Callable, Dict, Any, Awaitable, List
 
 from aiogram import BaseMiddleware
 from aiogram.types import Update
@@ -7,6 +7,11 @@ from sqlalchemy.orm import sessionmaker
 
 
 class DBSessionMiddleware(BaseMiddleware):
+    """
+    One session and one commit per update. Handlers can append zero-argument
+    coroutine functions to data["after_commit"]; they run only once the
+    update's transaction has been committed.
+    """
 
     def __init__(self, async_session_factory: sessionmaker):
         super().__init__()
@@ -26,11 +31,12 @@ class DBSessionMiddleware(BaseMiddleware):
 
         async with self.async_session_factory() as session:
             data["session"] = session
+            after_commit: List[Callable[[], Awaitable[Any]]] = []
+            data["after_commit"] = after_commit
             try:
                 result = await handler(event, data)
 
                 await session.commit()
-                return result
             except Exception:
                 await session.rollback()
                 logging.error(
@@ -38,3 +44,12 @@ class DBSessionMiddleware(BaseMiddleware):
                 )
                 raise
 
+        for callback in after_commit:
+            try:
+                await callback()
+            except Exception:
+                logging.error(
+                    "DBSessionMiddleware: after-commit callback failed.", exc_info=True
+                )
+        return result
+
@@ -18,6 +18,7 @@ class JsonI18n:
         self.path = path
         self.default_lang = default
         self.locales_data: Dict[str, Dict[str, str]] = {}
+        self._translators: Dict[str, Callable[..., str]] = {}
         self._load_locales()
         logging.info(
             f"JsonI18n initialized. Loaded languages: {list(self.locales_data.keys())}. Default: {self.default_lang}"
@@ -96,6 +97,35 @@ class JsonI18n:
                 exc_info=True)
             return text
 
+    def translator(self, lang_code: Optional[str]) -> Callable[..., str]:
+        """Return a callable bound to the language dict, memoized per language.
+
+        Hits are a dict lookup plus format; misses and formatting errors fall
+        back to gettext so its fallback chain and logging stay in one place.
+        """
+        if not lang_code or lang_code not in self.locales_data:
+            lang_code = self.default_lang
+        cached = self._translators.get(lang_code)
+        if cached is not None:
+            return cached
+
+        lang_data = self.locales_data.get(lang_code) or {}
+        gettext = self.gettext
+
+        def _(key: str, **kwargs) -> str:
+            text = lang_data.get(key)
+            if text is None:
+                return gettext(lang_code, key, **kwargs)
+            if not kwargs:
+                return text
+            try:
+                return text.format(**kwargs)
+            except Exception:
+                return gettext(lang_code, key, **kwargs)
+
+        self._translators[lang_code] = _
+        return _
+
 
 _i18n_instance_singleton: Optional[JsonI18n] = None
 
@@ -138,8 +168,11 @@ class I18nMiddleware(BaseMiddleware):
 
         if event_user:
             try:
-                user_db_model = await user_dal.get_user_by_id(
-                    session, event_user.id)
+                if "db_user" in data:
+                    user_db_model = data["db_user"]
+                else:
+                    user_db_model = await user_dal.get_user_by_id(
+                        session, event_user.id)
                 if user_db_model and user_db_model.language_code and user_db_model.language_code in self.i18n.locales_data:
                     current_language = user_db_model.language_code
                 elif event_user.language_code:
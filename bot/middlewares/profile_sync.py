@@ -22,7 +22,10 @@ class ProfileSyncMiddleware(BaseMiddleware):
 
         if session and tg_user:
             try:
-                db_user = await user_dal.get_user_by_id(session, tg_user.id)
+                if "db_user" in data:
+                    db_user = data["db_user"]
+                else:
+                    db_user = await user_dal.get_user_by_id(session, tg_user.id)
                 if db_user:
                     update_payload: Dict[str, Any] = {}
                     sanitized_username = sanitize_username(tg_user.username)
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Union
+
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter, TelegramServerError
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+    from config.settings import Settings
+
+_THROTTLED_METHOD_PREFIXES = ("send", "copy", "forward", "edit")
+
+# Seconds the current request spent sleeping in RateLimitMiddleware, so the
+# concurrency controller wrapped around it can leave that out of latency.
+_throttle_delay: ContextVar[float] = ContextVar("_throttle_delay", default=0.0)
+
+# File uploads take as long as the payload needs, so their latency says
+# nothing about Bot API load and would shrink the limit for no reason.
+_UPLOAD_METHODS = frozenset(
+    {
+        "sendPhoto",
+        "sendDocument",
+        "sendVideo",
+        "sendAudio",
+        "sendAnimation",
+        "sendVoice",
+        "sendVideoNote",
+        "sendMediaGroup",
+        "sendSticker",
+        "sendPaidMedia",
+        "setChatPhoto",
+        "setStickerSetThumbnail",
+        "uploadStickerFile",
+        "createNewStickerSet",
+        "addStickerToSet",
+        "editMessageMedia",
+    }
+)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware that keeps outgoing messages under Telegram limits.
+
+    A global sliding window caps all message-producing calls (30/s by default)
+    and a per-chat window caps groups and channels (20/min by default).
+    TelegramRetryAfter responses are retried after the requested delay.
+    """
+
+    def __init__(
+        self,
+        global_rate: int = 30,
+        global_period: float = 1.0,
+        group_rate: int = 20,
+        group_period: float = 60.0,
+        max_retries: int = 3,
+    ):
+        self.global_rate = global_rate
+        self.global_period = global_period
+        self.group_rate = group_rate
+        self.group_period = group_period
+        self.max_retries = max_retries
+        self._global_window: Deque[float] = deque()
+        self._chat_windows: Dict[Union[int, str], Deque[float]] = {}
+        self._next_sweep_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        api_method: str = getattr(method, "__api_method__", "")
+        if not api_method.startswith(_THROTTLED_METHOD_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            await self._acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                logging.warning(
+                    "RateLimitMiddleware: %s to chat %s hit flood control, retrying in %ss (attempt %s/%s)",
+                    api_method,
+                    chat_id,
+                    e.retry_after,
+                    attempt,
+                    self.max_retries,
+                )
+                _throttle_delay.set(_throttle_delay.get() + e.retry_after)
+                await asyncio.sleep(e.retry_after)
+
+    async def _acquire(self, chat_id: Optional[Union[int, str]]) -> None:
+        # Private chats (positive ids) are only bound by the global window.
+        is_group = isinstance(chat_id, str) or (isinstance(chat_id, int) and chat_id < 0)
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                self._sweep_idle_chats(now)
+                wait = self._wait_time(self._global_window, self.global_rate,
+                                       self.global_period, now)
+                chat_window: Optional[Deque[float]] = None
+                if is_group:
+                    chat_window = self._chat_windows.get(chat_id)
+                    if chat_window is not None:
+                        wait = max(wait, self._wait_time(chat_window, self.group_rate,
+                                                         self.group_period, now))
+                if wait <= 0:
+                    self._global_window.append(now)
+                    if is_group:
+                        if chat_window is None:
+                            chat_window = self._chat_windows[chat_id] = deque()
+                        chat_window.append(now)
+                    return
+            _throttle_delay.set(_throttle_delay.get() + wait)
+            await asyncio.sleep(wait)
+
+    def _sweep_idle_chats(self, now: float) -> None:
+        # Drop chats with no sends inside the window, at most once per period.
+        if now < self._next_sweep_at:
+            return
+        self._next_sweep_at = now + self.group_period
+        cutoff = now - self.group_period
+        idle = [chat_id for chat_id, window in self._chat_windows.items()
+                if not window or window[-1] <= cutoff]
+        for chat_id in idle:
+            del self._chat_windows[chat_id]
+
+    def _wait_time(self, window: Deque[float], rate: int, period: float,
+                   now: float) -> float:
+        while window and window[0] <= now - period:
+            window.popleft()
+        if len(window) < rate:
+            return 0.0
+        return window[0] + period - now
+
+
+class AIMDConcurrencyMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware that adapts the number of in-flight Bot API calls.
+
+    Every `window` completed calls the mean latency is compared to the
+    larger of `target_latency` and `baseline_factor` times the fastest call
+    seen, so a slow network path alone does not pin the limit at the minimum:
+    below it the limit grows additively, above it the limit is halved.
+    Flood control and 5xx responses halve the limit immediately. File uploads
+    and time spent waiting in RateLimitMiddleware are not sampled; register
+    this middleware before it so the rate limiter stamps sends only once a
+    concurrency slot is held.
+    """
+
+    def __init__(
+        self,
+        initial_concurrency: float = 8,
+        min_concurrency: float = 4,
+        max_concurrency: float = 30,
+        target_latency: float = 0.4,
+        baseline_factor: float = 2.0,
+        window: int = 50,
+        increase_step: float = 0.5,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.baseline_factor = baseline_factor
+        self.window = window
+        self.increase_step = increase_step
+        self._limit = float(
+            min(max_concurrency, max(min_concurrency, initial_concurrency))
+        )
+        self._in_flight = 0
+        self._latencies: List[float] = []
+        self._min_latency: Optional[float] = None
+        self._condition = asyncio.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return max(1, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.concurrency)
+            self._in_flight += 1
+
+        started_at = time.monotonic()
+        _throttle_delay.set(0.0)
+        try:
+            response = await make_request(bot, method)
+        except (TelegramRetryAfter, TelegramServerError):
+            self._decrease()
+            raise
+        else:
+            if method.__api_method__ not in _UPLOAD_METHODS:
+                self._record(
+                    time.monotonic() - started_at - _throttle_delay.get()
+                )
+            return response
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def _record(self, latency: float) -> None:
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+        self._latencies.append(latency)
+        if len(self._latencies) < self.window:
+            return
+        mean_latency = sum(self._latencies) / len(self._latencies)
+        self._latencies.clear()
+        threshold = max(self.target_latency,
+                        self._min_latency * self.baseline_factor)
+        if mean_latency < threshold:
+            self._limit = min(self.max_concurrency, self._limit + self.increase_step)
+        else:
+            self._decrease()
+
+    def _decrease(self) -> None:
+        previous = self._limit
+        self._limit = max(self.min_concurrency, self._limit * 0.5)
+        self._latencies.clear()
+        if self._limit != previous:
+            logging.info(
+                "AIMDConcurrencyMiddleware: Bot API concurrency reduced %.1f -> %.1f",
+                previous,
+                self._limit,
+            )
+
+
+_concurrency_controller: Optional[AIMDConcurrencyMiddleware] = None
+
+
+def init_concurrency_controller(
+    settings: "Settings",
+) -> Optional[AIMDConcurrencyMiddleware]:
+    """Initialize global Bot API concurrency controller (None when disabled)"""
+    global _concurrency_controller
+    if not settings.BOT_API_AIMD_ENABLED:
+        _concurrency_controller = None
+        return None
+    _concurrency_controller = AIMDConcurrencyMiddleware(
+        min_concurrency=settings.BOT_API_AIMD_MIN_CONCURRENCY,
+        max_concurrency=settings.BOT_API_AIMD_MAX_CONCURRENCY,
+        target_latency=settings.BOT_API_AIMD_TARGET_LATENCY,
+    )
+    return _concurrency_controller
+
+
+def get_concurrency_controller() -> Optional[AIMDConcurrencyMiddleware]:
+    """Get global Bot API concurrency controller instance"""
+    return _concurrency_controller
@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+
+class RequestClockMiddleware(BaseMiddleware):
+    """
+    Reads the clock once per update and exposes it as data["now_utc"], so all
+    timestamps written while handling one update are identical.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        data["now_utc"] = datetime.now(timezone.utc)
+        return await handler(event, data)
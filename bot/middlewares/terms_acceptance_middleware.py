@@ -1,17 +1,64 @@
 import logging
-from typing import Callable, Dict, Any, Awaitable, Optional, Union
+import time
+from typing import Callable, Dict, Any, Awaitable, Optional, Set, Tuple, Union
 
 from aiogram import BaseMiddleware, Bot
+from aiogram.enums import MessageEntityType
 from aiogram.types import Message, CallbackQuery, User, Update, InlineKeyboardMarkup
 from sqlalchemy.ext.asyncio import AsyncSession
-from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramBadRequest, AiogramError
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 
 from config.settings import Settings
 from db.dal import user_dal
+from db.models import User as DbUser
 
 from .i18n import JsonI18n
 from ..keyboards.inline.user_keyboards import get_terms_acceptance_keyboard
 
+_FALLBACK_TERMS_TEXT = "Для продолжения работы необходимо ознакомиться и принять соглашения."
+
+# Users who have not accepted yet are re-checked in the DB after this delay.
+NOT_ACCEPTED_RECHECK_SECONDS = 30
+NOT_ACCEPTED_MAX_ENTRIES = 10_000
+
+# Acceptance of a given TERMS_VERSION never reverts, so accepted users are
+# cached for as long as the process serves that version.
+_accepted_user_ids: Set[int] = set()
+_accepted_terms_version: Optional[str] = None
+
+
+def has_accepted_current_terms(db_user: Optional[DbUser], terms_version: str) -> bool:
+    return bool(db_user and db_user.terms_accepted
+                and db_user.terms_version == terms_version)
+
+
+def mark_terms_accepted(user_id: int) -> None:
+    """Let the user through the terms middleware without a DB lookup."""
+    _accepted_user_ids.add(user_id)
+
+
+def forget_terms_acceptance(user_id: int) -> None:
+    """Drop a cached acceptance, e.g. after the user row was deleted."""
+    _accepted_user_ids.discard(user_id)
+
+
+def _use_terms_version(terms_version: str) -> None:
+    global _accepted_terms_version
+    if _accepted_terms_version != terms_version:
+        _accepted_user_ids.clear()
+        _accepted_terms_version = terms_version
+
+
+def _is_start_command(message: Message) -> bool:
+    """True for "/start", "/start payload" and "/start@bot", using Telegram's entity."""
+    txt = message.text
+    if txt is None or not message.entities:
+        return False
+    entity = message.entities[0]
+    if entity.offset != 0 or entity.type != MessageEntityType.BOT_COMMAND:
+        return False
+    return txt[:6] == "/start" and (entity.length == 6 or txt[6] == "@")
+
 
 class TermsAcceptanceMiddleware(BaseMiddleware):
 
@@ -19,19 +66,39 @@ class TermsAcceptanceMiddleware(BaseMiddleware):
         super().__init__()
         self.settings = settings
         self.i18n_main_instance = i18n_instance
+        self._admin_ids = settings.admin_ids_set
+        _use_terms_version(settings.TERMS_VERSION)
+        self._accepted_ids = _accepted_user_ids
+        self._not_accepted_until: Dict[int, float] = {}
+        self._prompts = self._build_prompts()
+        self._default_prompt = self._prompts.get(
+            settings.DEFAULT_LANGUAGE, (_FALLBACK_TERMS_TEXT, None))
+
+    def _build_prompts(self) -> Dict[str, Tuple[str, Optional[InlineKeyboardMarkup]]]:
+        """Prompt text and keyboard per language; both depend only on static config."""
+        i18n = self.i18n_main_instance
+        if not i18n:
+            return {}
+        languages = set(i18n.locales_data) | {self.settings.DEFAULT_LANGUAGE}
+        return {
+            lang: (
+                i18n.gettext(lang, "terms_acceptance_required"),
+                get_terms_acceptance_keyboard(
+                    lang, i18n, self.settings.TERMS_DOCUMENTS_URL),
+            )
+            for lang in languages
+        }
 
     async def __call__(self, handler: Callable[[Update, Dict[str, Any]],
                                                Awaitable[Any]], event: Update,
                        data: Dict[str, Any]) -> Any:
-        session: AsyncSession = data["session"]
         event_user: Optional[User] = data.get("event_from_user")
-        bot_instance: Bot = data["bot"]
 
         if not event_user:
             return await handler(event, data)
 
         # Allow admins to bypass terms acceptance
-        if event_user.id in self.settings.ADMIN_IDS:
+        if event_user.id in self._admin_ids:
             return await handler(event, data)
 
         # Get the actual event object (Message or CallbackQuery)
@@ -41,8 +108,13 @@ class TermsAcceptanceMiddleware(BaseMiddleware):
         elif event.callback_query:
             actual_event_object = event.callback_query
 
+        # Only messages and callbacks are gated; inline queries, edits,
+        # chat member updates etc. pass through without touching the DB.
+        if actual_event_object is None:
+            return await handler(event, data)
+
         # Allow /start command to pass through (it will handle terms acceptance)
-        if isinstance(actual_event_object, Message) and actual_event_object.text and actual_event_object.text.startswith("/start"):
+        if isinstance(actual_event_object, Message) and _is_start_command(actual_event_object):
             return await handler(event, data)
 
         # Allow callback queries related to terms acceptance
@@ -50,65 +122,79 @@ class TermsAcceptanceMiddleware(BaseMiddleware):
             if actual_event_object.data.startswith("terms:"):
                 return await handler(event, data)
 
-        try:
-            db_user_model = await user_dal.get_user_by_id(
-                session, event_user.id)
-        except Exception as e_db:
-            logging.error(
-                f"TermsAcceptanceMiddleware: DB error fetching user {event_user.id}: {e_db}",
-                exc_info=True)
+        if event_user.id in self._accepted_ids:
             return await handler(event, data)
 
-        # If user doesn't exist yet, allow /start to create them
-        if not db_user_model:
-            return await handler(event, data)
+        terms_accepted = False
+        if self._not_accepted_until.get(event_user.id, 0) <= time.monotonic():
+            try:
+                if "db_user" in data:
+                    db_user_model = data["db_user"]
+                else:
+                    # Only without UserLoaderMiddleware in front of us.
+                    session: AsyncSession = data["session"]
+                    db_user_model = await user_dal.get_user_by_id(
+                        session, event_user.id)
+                accepted_flag = None
+                if db_user_model:
+                    accepted_flag = has_accepted_current_terms(
+                        db_user_model, self.settings.TERMS_VERSION)
+            except Exception as e_db:
+                logging.error(
+                    f"TermsAcceptanceMiddleware: DB error fetching user {event_user.id}: {e_db}",
+                    exc_info=True)
+                return await handler(event, data)
+
+            # If user doesn't exist yet, allow /start to create them
+            if accepted_flag is None:
+                return await handler(event, data)
+
+            terms_accepted = bool(accepted_flag)
+            if terms_accepted:
+                self._accepted_ids.add(event_user.id)
+                self._not_accepted_until.pop(event_user.id, None)
+            else:
+                if len(self._not_accepted_until) >= NOT_ACCEPTED_MAX_ENTRIES:
+                    self._not_accepted_until.clear()
+                self._not_accepted_until[event_user.id] = (
+                    time.monotonic() + NOT_ACCEPTED_RECHECK_SECONDS)
 
         # Check if user has accepted terms
-        if not db_user_model.terms_accepted:
+        if not terms_accepted:
             logging.info(
                 f"User {event_user.id} ({event_user.username or 'NoUsername'}) has not accepted terms. Blocking access."
             )
 
-            i18n_data_from_event = data.get("i18n_data", {})
-            current_lang = i18n_data_from_event.get(
+            current_lang = data.get("i18n_data", {}).get(
                 "current_language", self.settings.DEFAULT_LANGUAGE)
-            i18n_to_use: Optional[JsonI18n] = i18n_data_from_event.get(
-                "i18n_instance", self.i18n_main_instance)
-
-            terms_message_text = "Для продолжения работы необходимо ознакомиться и принять соглашения."
-            keyboard: Optional[InlineKeyboardMarkup] = None
-
-            if i18n_to_use:
-                _ = lambda k, **kw: i18n_to_use.gettext(current_lang, k, **kw)
-                terms_message_text = _("terms_acceptance_required")
-                keyboard = get_terms_acceptance_keyboard(
-                    current_lang, i18n_to_use, self.settings.TERMS_DOCUMENTS_URL)
+            terms_message_text, keyboard = self._prompts.get(
+                current_lang, self._default_prompt)
+            bot_instance: Bot = data["bot"]
 
             try:
                 if isinstance(actual_event_object, Message):
                     await actual_event_object.answer(terms_message_text,
                                                      reply_markup=keyboard)
-                elif isinstance(actual_event_object, CallbackQuery):
+                else:
                     await actual_event_object.answer(terms_message_text,
                                                      show_alert=True)
                     if actual_event_object.message:
                         try:
                             await actual_event_object.message.edit_text(
                                 terms_message_text, reply_markup=keyboard)
-                        except (TelegramAPIError, AiogramError):
-                            await bot_instance.send_message(
-                                actual_event_object.from_user.id,
-                                terms_message_text,
-                                reply_markup=keyboard)
+                        except TelegramBadRequest as e_edit:
+                            # Prompt already on screen; other API errors
+                            # (flood control, 5xx) must not trigger a resend.
+                            if "message is not modified" not in str(e_edit):
+                                await bot_instance.send_message(
+                                    actual_event_object.from_user.id,
+                                    terms_message_text,
+                                    reply_markup=keyboard)
                     else:
                         await bot_instance.send_message(
                             actual_event_object.from_user.id,
                             terms_message_text,
                             reply_markup=keyboard)
-                else:
-                    await bot_instance.send_message(event_user.id,
-                                                    terms_message_text,
-                                                    reply_markup=keyboard)
                 logging.info(f"Terms acceptance notification sent to user {event_user.id}.")
             except TelegramForbiddenError:
                 logging.warning(
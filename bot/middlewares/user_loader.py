@@ -0,0 +1,36 @@
+import logging
+from typing import Callable, Dict, Any, Awaitable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update, User as TgUser
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.dal import user_dal
+
+
+class UserLoaderMiddleware(BaseMiddleware):
+    """
+    Loads the DB user for the event once and exposes it as data["db_user"]
+    (None when the user is not registered yet), so later middlewares and
+    handlers share one instance instead of re-selecting the row.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        session: Optional[AsyncSession] = data.get("session")
+        tg_user: Optional[TgUser] = data.get("event_from_user")
+
+        if session and tg_user:
+            try:
+                data["db_user"] = await user_dal.get_user_by_id(session, tg_user.id)
+            except Exception as e:
+                logging.error(
+                    f"UserLoaderMiddleware: Failed to load user {tg_user.id}: {e}",
+                    exc_info=True,
+                )
+
+        return await handler(event, data)
@@ -0,0 +1,69 @@
+import time
+from typing import Dict, Optional, Tuple
+
+
+class MembershipCache:
+    """Process-local TTL cache of required channel membership statuses.
+
+    Non-member results expire after `negative_ttl_seconds` so a user who has
+    just joined the channel is let through quickly even without pressing
+    the check button.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 600,
+        negative_ttl_seconds: float = 30,
+        max_entries: int = 50_000,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple[int, int], Tuple[float, Optional[str]]] = {}
+
+    def get(self, channel_id: int, user_id: int) -> Tuple[bool, Optional[str]]:
+        """Return (hit, status) for the given channel/user pair."""
+        key = (channel_id, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, status = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return False, None
+        return True, status
+
+    def set(
+        self,
+        channel_id: int,
+        user_id: int,
+        status: Optional[str],
+        is_member: bool,
+    ) -> None:
+        ttl = (
+            self.ttl_seconds
+            if is_member
+            else min(self.ttl_seconds, self.negative_ttl_seconds)
+        )
+        if ttl <= 0:
+            return
+        if len(self._entries) >= self.max_entries:
+            self._evict_expired()
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+        self._entries[(channel_id, user_id)] = (
+            time.monotonic() + ttl,
+            status,
+        )
+
+    def invalidate(self, channel_id: int, user_id: int) -> None:
+        self._entries.pop((channel_id, user_id), None)
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+
+
+membership_cache = MembershipCache()
@@ -1,4 +1,5 @@
 import re
+import sys
 import unicodedata
 from typing import Optional
 
@@ -68,6 +69,24 @@ _RUSSIAN_SERVICE_PATTERNS = [
     re.compile(r"(?i)абуз\w*"),
 ]
 
+_REMOVAL_PATTERNS = tuple(
+    _URL_PATTERNS
+    + _OBFUSCATED_DOMAIN_PATTERNS
+    + _ENGLISH_SERVICE_PATTERNS
+    + _RUSSIAN_SERVICE_PATTERNS
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Obfuscation characters and whitespace are non-alphanumeric too, so a single
+# pass removes them along with everything else.
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+# Deletes nonspacing marks (category Mn) left over after NFKD decomposition.
+_STRIP_NONSPACING_MARKS = dict.fromkeys(
+    cp for cp in range(sys.maxunicode + 1)
+    if unicodedata.category(chr(cp)) == "Mn"
+)
+
 _PRE_LOWER_TRANSLATION = str.maketrans(
     {
         "I": "l",
@@ -153,32 +172,21 @@ def _normalize_for_detection(value: str) -> str:
     normalized = unicodedata.normalize("NFKD", value)
     normalized = normalized.translate(_PRE_LOWER_TRANSLATION)
     normalized = normalized.lower()
-    normalized = "".join(
-        ch for ch in normalized if unicodedata.category(ch) != "Mn"
-    )
+    normalized = normalized.translate(_STRIP_NONSPACING_MARKS)
     normalized = normalized.translate(_POST_LOWER_TRANSLATION)
     normalized = normalized.replace("rn", "m")
-
-    pattern = rf"[{re.escape(_OBFUSCATION_CHARS)}\s]+"
-    normalized = re.sub(pattern, "", normalized)
-    normalized = re.sub(r"[^a-z0-9]+", "", normalized)
-    return normalized
+    return _NON_ALNUM_RE.sub("", normalized)
 
 
 def _remove_patterns(value: str) -> str:
     updated = value
-    for pattern in (
-        _URL_PATTERNS
-        + _OBFUSCATED_DOMAIN_PATTERNS
-        + _ENGLISH_SERVICE_PATTERNS
-        + _RUSSIAN_SERVICE_PATTERNS
-    ):
+    for pattern in _REMOVAL_PATTERNS:
         updated = pattern.sub(" ", updated)
     return updated
 
 
 def _finalize(value: str) -> Optional[str]:
-    compacted = re.sub(r"\s+", " ", value)
+    compacted = _WHITESPACE_RE.sub(" ", value)
     compacted = compacted.strip(" \t\r\n-_.,/\\")
     compacted = compacted.strip()
     if not compacted:
@@ -1,4 +1,5 @@
 import logging
+from functools import cached_property
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field, ValidationError, computed_field, field_validator
 from typing import Optional, List, Dict, Any
@@ -35,6 +36,18 @@ class Settings(BaseSettings):
     REQUIRED_CHANNEL_LINK: Optional[str] = Field(
         default=None,
         description="Public username or invite link to the required channel for join button")
+    REQUIRED_CHANNEL_CHECK_CACHE_TTL_SECONDS: int = Field(
+        default=600,
+        description="How long a required channel membership check result is reused before asking Telegram again (0 disables caching)")
+
+    BOT_API_AIMD_ENABLED: bool = Field(
+        default=False,
+        description="Adapt the number of concurrent Bot API calls to observed latency")
+    BOT_API_AIMD_TARGET_LATENCY: float = Field(
+        default=0.4,
+        description="Mean Bot API call latency in seconds above which concurrency is halved (raised to twice the fastest observed call on slow links)")
+    BOT_API_AIMD_MIN_CONCURRENCY: int = Field(default=4)
+    BOT_API_AIMD_MAX_CONCURRENCY: int = Field(default=30)
 
     YOOKASSA_SHOP_ID: Optional[str] = None
     YOOKASSA_SECRET_KEY: Optional[str] = None
@@ -174,7 +187,7 @@ class Settings(BaseSettings):
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
     @computed_field
-    @property
+    @cached_property
     def ADMIN_IDS(self) -> List[int]:
         if self.ADMIN_IDS_STR:
             try:
@@ -196,6 +209,11 @@ class Settings(BaseSettings):
         ids = self.ADMIN_IDS
         return ids[0] if ids else None
 
+    @cached_property
+    def admin_ids_set(self) -> frozenset:
+        """ADMIN_IDS as a frozenset for O(1) membership checks."""
+        return frozenset(self.ADMIN_IDS)
+
     @computed_field
     @property
     def trial_traffic_limit_bytes(self) -> int:
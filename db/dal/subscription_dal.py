@@ -52,6 +52,8 @@ async def update_subscription(
             setattr(sub, key, value)
         await session.flush()
         await session.refresh(sub)
+        if update_data.get("user_id") is not None:
+            await _mark_user_has_ever_subscribed(session, sub)
     return sub
 
 
@@ -101,6 +103,8 @@ async def upsert_subscription(session: AsyncSession,
                 setattr(existing_sub, key, value)
         await session.flush()
         await session.refresh(existing_sub)
+        if sub_payload.get("user_id") is not None:
+            await _mark_user_has_ever_subscribed(session, existing_sub)
         return existing_sub
     else:
         logging.info(
@@ -125,9 +129,23 @@ async def upsert_subscription(session: AsyncSession,
         session.add(new_sub)
         await session.flush()
         await session.refresh(new_sub)
+        await _mark_user_has_ever_subscribed(session, new_sub)
         return new_sub
 
 
+async def _mark_user_has_ever_subscribed(session: AsyncSession,
+                                         sub: Subscription) -> None:
+    # Must mirror has_any_subscription_for_user, which counts by user_id, so
+    # call it wherever a subscription row gets a non-null user_id.
+    if sub.user_id is None:
+        return
+    await session.execute(
+        update(User).where(User.user_id == sub.user_id,
+                           User.has_ever_subscribed == False).values(
+            has_ever_subscribed=True).execution_options(
+                synchronize_session="fetch"))
+
+
 async def deactivate_other_active_subscriptions(
         session: AsyncSession, panel_user_uuid: str,
         current_panel_subscription_uuid: Optional[str]):
@@ -166,6 +184,10 @@ async def delete_all_user_subscriptions(
     """Completely delete all user subscriptions (for trial reset)"""
     stmt = delete(Subscription).where(Subscription.user_id == user_id)
     result = await session.execute(stmt)
+    await session.execute(
+        update(User).where(User.user_id == user_id).values(
+            has_ever_subscribed=False).execution_options(
+                synchronize_session="fetch"))
     if result.rowcount > 0:
         logging.info(
             f"Deleted {result.rowcount} subscription records for user {user_id} for trial reset."
@@ -1,11 +1,12 @@
 import logging
 import secrets
 import string
+import time
 from typing import Optional, List, Dict, Any, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy import update, delete, func, and_, or_
+from sqlalchemy import update, delete, func, and_, or_, literal_column, Boolean
 from datetime import datetime, timezone
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
@@ -23,6 +24,12 @@ from ..models import (
 REFERRAL_CODE_ALPHABET = string.ascii_uppercase + string.digits
 REFERRAL_CODE_LENGTH = 9
 MAX_REFERRAL_CODE_ATTEMPTS = 25
+REFERRAL_CODE_CACHE_TTL_SECONDS = 3600
+REFERRAL_CODE_CACHE_MAX_ENTRIES = 10_000
+
+# referral code -> (expires_at, user_id); codes map to a single user for life,
+# so popular referrers resolve without touching the database.
+_referral_code_cache: Dict[str, Tuple[float, int]] = {}
 
 
 def _generate_referral_code_candidate() -> str:
@@ -49,6 +56,11 @@ async def generate_unique_referral_code(session: AsyncSession) -> str:
     raise RuntimeError("Failed to generate a unique referral code after several attempts.")
 
 
+def invalidate_referral_code_cache(referral_code: Optional[str]) -> None:
+    if referral_code:
+        _referral_code_cache.pop(referral_code.strip().upper(), None)
+
+
 async def ensure_referral_code(session: AsyncSession, user: User) -> str:
     """
     Ensure the provided user has a referral code, generating and persisting it if missing.
@@ -57,6 +69,7 @@ async def ensure_referral_code(session: AsyncSession, user: User) -> str:
     if user.referral_code:
         normalized = user.referral_code.strip().upper()
         if normalized != user.referral_code:
+            invalidate_referral_code_cache(user.referral_code)
             user.referral_code = normalized
             await session.flush()
             await session.refresh(user)
@@ -134,6 +147,63 @@ async def create_user(session: AsyncSession, user_data: Dict[str, Any]) -> Tuple
     return user, created
 
 
+async def upsert_user_on_start(
+    session: AsyncSession, user_data: Dict[str, Any]
+) -> Tuple[User, bool]:
+    """Insert the user or refresh their profile fields in a single statement.
+
+    Returns a tuple of (user, created_flag).
+    """
+
+    if "registration_date" not in user_data:
+        user_data["registration_date"] = datetime.now(timezone.utc)
+
+    # A collision across 36^9 codes is negligible, so skip the existence
+    # round-trip used by create_user; the value is ignored for existing rows.
+    if not user_data.get("referral_code"):
+        user_data["referral_code"] = _generate_referral_code_candidate()
+    else:
+        user_data["referral_code"] = user_data["referral_code"].strip().upper()
+
+    stmt = pg_insert(User).values(**user_data)
+    profile_columns = [
+        col
+        for col in ("username", "first_name", "last_name", "language_code")
+        if col in user_data
+    ]
+    # Skip the row write (and its dead tuple) when nothing changed; the
+    # conflicting row is then not returned and is loaded separately.
+    stmt = (
+        stmt.on_conflict_do_update(
+            index_elements=[User.user_id],
+            set_={col: stmt.excluded[col] for col in profile_columns},
+            where=or_(
+                *(
+                    getattr(User, col).is_distinct_from(stmt.excluded[col])
+                    for col in profile_columns
+                )
+            ),
+        )
+        .returning(User, literal_column("(xmax = 0)", Boolean).label("created"))
+        .execution_options(populate_existing=True)
+    )
+
+    result = await session.execute(stmt)
+    row = result.one_or_none()
+    if row is None:
+        # Usually already in the identity map via UserLoaderMiddleware.
+        user = await session.get(User, user_data["user_id"])
+        return user, False
+    user, created = row
+
+    if created:
+        logging.info(
+            f"New user {user.user_id} created in DAL. Referred by: {user.referred_by_id or 'N/A'}."
+        )
+
+    return user, bool(created)
+
+
 async def get_user_by_referral_code(session: AsyncSession, referral_code: str) -> Optional[User]:
     normalized = referral_code.strip().upper()
     if not normalized:
@@ -143,6 +213,32 @@ async def get_user_by_referral_code(session: AsyncSession, referral_code: str) -
     return result.scalar_one_or_none()
 
 
+async def get_user_id_by_referral_code(session: AsyncSession, referral_code: str) -> Optional[int]:
+    """Resolve a referral code to its owner's user_id, cached in-process."""
+    normalized = referral_code.strip().upper()
+    if not normalized:
+        return None
+
+    now = time.monotonic()
+    entry = _referral_code_cache.get(normalized)
+    if entry is not None:
+        expires_at, cached_user_id = entry
+        if expires_at > now:
+            return cached_user_id
+        _referral_code_cache.pop(normalized, None)
+
+    stmt = select(User.user_id).where(User.referral_code == normalized)
+    result = await session.execute(stmt)
+    user_id = result.scalar_one_or_none()
+    if user_id is None:
+        return None
+
+    if len(_referral_code_cache) >= REFERRAL_CODE_CACHE_MAX_ENTRIES:
+        _referral_code_cache.pop(next(iter(_referral_code_cache)))
+    _referral_code_cache[normalized] = (now + REFERRAL_CODE_CACHE_TTL_SECONDS, user_id)
+    return user_id
+
+
 async def update_user(
     session: AsyncSession, user_id: int, update_data: Dict[str, Any]
 ) -> Optional[User]:
@@ -155,6 +251,23 @@ async def update_user(
     return user
 
 
+async def update_user_fast(
+    session: AsyncSession, user_id: int, update_data: Dict[str, Any]
+) -> bool:
+    """Issue a single UPDATE without loading the row or flushing the session.
+
+    Already loaded User instances are not refreshed.
+    """
+    stmt = (
+        update(User)
+        .where(User.user_id == user_id)
+        .values(**update_data)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    return result.rowcount > 0
+
+
 async def update_user_language(
     session: AsyncSession, user_id: int, lang_code: str
 ) -> bool:
@@ -357,6 +470,7 @@ async def delete_user_and_relations(session: AsyncSession, user_id: int) -> bool
     await session.execute(delete(UserBilling).where(UserBilling.user_id == user_id))
     await session.execute(delete(AdAttribution).where(AdAttribution.user_id == user_id))
 
+    invalidate_referral_code_cache(user.referral_code)
     await session.delete(user)
     await session.flush()
     return True
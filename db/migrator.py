@@ -1,8 +1,8 @@
 import logging
 from dataclasses import dataclass
-from typing import Callable, List, Set
+from typing import Callable, List, Optional, Set
 
-from sqlalchemy import inspect, text
+from sqlalchemy import bindparam, text
 from sqlalchemy.engine import Connection
 
 
@@ -26,31 +26,42 @@ def _ensure_migrations_table(connection: Connection) -> None:
     )
 
 
+def _existing_columns(connection: Connection, table: str) -> Set[str]:
+    result = connection.execute(
+        text(
+            """
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = :table
+            """
+        ),
+        {"table": table},
+    )
+    return {row[0] for row in result}
+
+
+def _alter_users_table(connection: Connection, col_defs: List[str]) -> None:
+    """Apply all column changes in one ALTER TABLE (one lock, one catalog update)."""
+    if col_defs:
+        connection.execute(text(f"ALTER TABLE users {', '.join(col_defs)}"))
+
+
 def _migration_0001_add_channel_subscription_fields(connection: Connection) -> None:
-    inspector = inspect(connection)
-    columns: Set[str] = {col["name"] for col in inspector.get_columns("users")}
-    statements: List[str] = []
+    columns = _existing_columns(connection, "users")
+    col_defs: List[str] = []
 
     if "channel_subscription_verified" not in columns:
-        statements.append(
-            "ALTER TABLE users ADD COLUMN channel_subscription_verified BOOLEAN"
-        )
+        col_defs.append("ADD COLUMN channel_subscription_verified BOOLEAN")
     if "channel_subscription_checked_at" not in columns:
-        statements.append(
-            "ALTER TABLE users ADD COLUMN channel_subscription_checked_at TIMESTAMPTZ"
-        )
+        col_defs.append("ADD COLUMN channel_subscription_checked_at TIMESTAMPTZ")
     if "channel_subscription_verified_for" not in columns:
-        statements.append(
-            "ALTER TABLE users ADD COLUMN channel_subscription_verified_for BIGINT"
-        )
+        col_defs.append("ADD COLUMN channel_subscription_verified_for BIGINT")
 
-    for stmt in statements:
-        connection.execute(text(stmt))
+    _alter_users_table(connection, col_defs)
 
 
 def _migration_0002_add_referral_code(connection: Connection) -> None:
-    inspector = inspect(connection)
-    columns: Set[str] = {col["name"] for col in inspector.get_columns("users")}
+    columns = _existing_columns(connection, "users")
 
     if "referral_code" not in columns:
         connection.execute(
@@ -60,26 +71,11 @@ def _migration_0002_add_referral_code(connection: Connection) -> None:
     connection.execute(
         text(
             """
-            WITH generated_codes AS (
-                SELECT
-                    user_id,
-                    UPPER(
-                        SUBSTRING(
-                            md5(
-                                user_id::text
-                                || clock_timestamp()::text
-                                || random()::text
-                            )
-                            FROM 1 FOR 9
-                        )
-                    ) AS referral_code
-                FROM users
-                WHERE referral_code IS NULL OR referral_code = ''
+            UPDATE users
+            SET referral_code = UPPER(
+                LEFT(REPLACE(gen_random_uuid()::text, '-', ''), 9)
             )
-            UPDATE users AS u
-            SET referral_code = g.referral_code
-            FROM generated_codes AS g
-            WHERE u.user_id = g.user_id
+            WHERE referral_code IS NULL OR referral_code = ''
             """
         )
     )
@@ -96,11 +92,24 @@ def _migration_0002_add_referral_code(connection: Connection) -> None:
 
 
 def _migration_0003_normalize_referral_codes(connection: Connection) -> None:
-    inspector = inspect(connection)
-    columns: Set[str] = {col["name"] for col in inspector.get_columns("users")}
+    columns = _existing_columns(connection, "users")
     if "referral_code" not in columns:
         return
 
+    # Avoid a full-table UPDATE (and its WAL record) when nothing is mis-cased.
+    has_mixed_case = connection.execute(
+        text(
+            """
+            SELECT 1 FROM users
+            WHERE referral_code IS NOT NULL
+              AND referral_code <> UPPER(referral_code)
+            LIMIT 1
+            """
+        )
+    ).first()
+    if has_mixed_case is None:
+        return
+
     connection.execute(
         text(
             """
@@ -114,25 +123,42 @@ def _migration_0003_normalize_referral_codes(connection: Connection) -> None:
 
 
 def _migration_0004_add_terms_acceptance_fields(connection: Connection) -> None:
-    inspector = inspect(connection)
-    columns: Set[str] = {col["name"] for col in inspector.get_columns("users")}
-    statements: List[str] = []
+    columns = _existing_columns(connection, "users")
+    col_defs: List[str] = []
 
     if "terms_accepted" not in columns:
-        statements.append(
-            "ALTER TABLE users ADD COLUMN terms_accepted BOOLEAN DEFAULT FALSE"
-        )
+        col_defs.append("ADD COLUMN terms_accepted BOOLEAN DEFAULT FALSE")
     if "terms_accepted_at" not in columns:
-        statements.append(
-            "ALTER TABLE users ADD COLUMN terms_accepted_at TIMESTAMPTZ"
-        )
+        col_defs.append("ADD COLUMN terms_accepted_at TIMESTAMPTZ")
     if "terms_version" not in columns:
-        statements.append(
-            "ALTER TABLE users ADD COLUMN terms_version VARCHAR"
+        col_defs.append("ADD COLUMN terms_version VARCHAR")
+
+    _alter_users_table(connection, col_defs)
+
+
+def _migration_0005_add_has_ever_subscribed(connection: Connection) -> None:
+    columns = _existing_columns(connection, "users")
+
+    if "has_ever_subscribed" not in columns:
+        connection.execute(
+            text(
+                "ALTER TABLE users ADD COLUMN has_ever_subscribed BOOLEAN NOT NULL DEFAULT FALSE"
+            )
         )
 
-    for stmt in statements:
-        connection.execute(text(stmt))
+    connection.execute(
+        text(
+            """
+            UPDATE users
+            SET has_ever_subscribed = TRUE
+            WHERE has_ever_subscribed = FALSE
+              AND EXISTS (
+                  SELECT 1 FROM subscriptions s WHERE s.user_id = users.user_id
+              )
+            """
+        )
+    )
+
 
 MIGRATIONS: List[Migration] = [
     Migration(
@@ -155,22 +181,44 @@ MIGRATIONS: List[Migration] = [
         description="Add columns to track terms of service acceptance (terms_accepted, terms_accepted_at, terms_version)",
         upgrade=_migration_0004_add_terms_acceptance_fields,
     ),
+    Migration(
+        id="0005_add_has_ever_subscribed",
+        description="Materialize whether a user ever had a subscription (has_ever_subscribed) and backfill it",
+        upgrade=_migration_0005_add_has_ever_subscribed,
+    ),
 ]
 
 
-def run_database_migrations(connection: Connection) -> None:
-    """
-    Apply pending migrations sequentially. Already applied revisions are skipped.
-    """
-    _ensure_migrations_table(connection)
-
-    applied_revisions: Set[str] = {
+def _load_applied_revisions(connection: Connection) -> Optional[Set[str]]:
+    """Known revisions recorded in schema_migrations, or None if the table is missing."""
+    table_exists = connection.execute(
+        text("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    ).scalar()
+    if not table_exists:
+        return None
+    return {
         row[0]
         for row in connection.execute(
-            text("SELECT id FROM schema_migrations")
+            text(
+                "SELECT id FROM schema_migrations WHERE id IN :ids"
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"ids": [migration.id for migration in MIGRATIONS]},
         )
     }
 
+
+def run_database_migrations(connection: Connection) -> None:
+    """
+    Apply pending migrations sequentially. Already applied revisions are skipped.
+    """
+    applied_revisions = _load_applied_revisions(connection)
+    if applied_revisions is None:
+        _ensure_migrations_table(connection)
+        applied_revisions = set()
+    elif len(applied_revisions) == len(MIGRATIONS):
+        return
+
+    newly_applied: List[str] = []
     for migration in MIGRATIONS:
         if migration.id in applied_revisions:
             continue
@@ -181,12 +229,6 @@ def run_database_migrations(connection: Connection) -> None:
         try:
             with connection.begin_nested():
                 migration.upgrade(connection)
-                connection.execute(
-                    text(
-                        "INSERT INTO schema_migrations (id) VALUES (:revision)"
-                    ),
-                    {"revision": migration.id},
-                )
         except Exception as exc:
             logging.error(
                 "Migrator: failed to apply %s (%s)",
@@ -196,4 +238,13 @@ def run_database_migrations(connection: Connection) -> None:
             )
             raise exc
         else:
+            newly_applied.append(migration.id)
             logging.info("Migrator: migration %s applied successfully", migration.id)
+
+    # Recorded in one executemany; the caller's transaction makes the upgrades
+    # and their bookkeeping commit (or roll back) together.
+    if newly_applied:
+        connection.execute(
+            text("INSERT INTO schema_migrations (id) VALUES (:revision)"),
+            [{"revision": revision} for revision in newly_applied],
+        )
@@ -1,7 +1,7 @@
 from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Float, ForeignKey, UniqueConstraint, Text, BigInteger
 from sqlalchemy.orm import relationship, DeclarativeBase
 from sqlalchemy.ext.asyncio import AsyncAttrs
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, false
 from datetime import datetime
 
 
@@ -32,6 +32,10 @@ class User(Base):
     terms_accepted = Column(Boolean, nullable=True, default=False)
     terms_accepted_at = Column(DateTime(timezone=True), nullable=True)
     terms_version = Column(String, nullable=True)
+    has_ever_subscribed = Column(Boolean,
+                                 nullable=False,
+                                 default=False,
+                                 server_default=false())
 
     referrer = relationship("User", remote_side=[user_id], backref="referrals")
     subscriptions = relationship("Subscription",